@@ -0,0 +1,26 @@
+import io
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import video2OcrTranslateAoffOn as v2o
+
+
+def test_short_chunks_terminate():
+    # --whisper-chunk 5 (pari alla finestra di ricerca) su un segnale che cresce: il punto di minima energia
+    # è sempre all'inizio del buffer, il generatore deve comunque avanzare e coprire tutto l'audio
+    rng = np.random.default_rng(0)
+    samples = rng.uniform(-1, 1, 20 * v2o.AUDIO_RATE) * np.linspace(0.05, 0.5, 20 * v2o.AUDIO_RATE)
+    pcm = (samples * 32767).astype("<i2").tobytes()
+    chunks = []
+    reader = threading.Thread(target=lambda: chunks.extend(v2o.audio_chunks(io.BytesIO(pcm), 5.0)), daemon=True)
+    reader.start()
+    reader.join(10)
+
+    assert not reader.is_alive()
+    assert sum(len(chunk) for _, chunk in chunks) == 20 * v2o.AUDIO_RATE
+    assert all(len(chunk) >= 2 * v2o.AUDIO_RATE for _, chunk in chunks[:-1])
@@ -0,0 +1,30 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import video2OcrTranslate as v2o
+
+
+def test_dotted_video_name(tmp_path, monkeypatch):
+    # Nome video con punti: il frame "cam.2024-05-01-0002" appartiene al video "cam.2024-05-01"
+    images = tmp_path / "02.images"
+    images.mkdir()
+    for n in (1, 2):
+        (images / f"cam.2024-05-01-{n:04d}.png").write_bytes(b"")
+    index = v2o.FrameIndex()
+    index.open(tmp_path / "index.sqlite")
+    monkeypatch.setitem(v2o.DIRS, "images", images)
+    monkeypatch.setattr(v2o, "INDEX", index)
+    monkeypatch.setattr(v2o, "probe_duration", lambda video: 0.4)
+
+    v2o.write_frame_timestamps(Path("cam.2024-05-01.mp4"), [0.0, 0.2])
+    index.put_ocr("cam.2024-05-01-0002", "ciao", 90.0)
+    rows = index.db.execute("SELECT frame, video, frame_no, timestamp, ocr_text FROM frames ORDER BY frame_no").fetchall()
+    # L'ultimo frame resta a schermo fino alla fine del video (0.4 s), non oltre
+    on_screen = [[frame for _, frame, *_ in index.lookup(seconds)[0]] for seconds in (0.1, 0.3, 7200)]
+    index.close()
+
+    assert rows == [("cam.2024-05-01-0001", "cam.2024-05-01", 1, 0.0, None),
+                    ("cam.2024-05-01-0002", "cam.2024-05-01", 2, 0.2, "ciao")]
+    assert on_screen == [["cam.2024-05-01-0001"], ["cam.2024-05-01-0002"], []]
@@ -0,0 +1,17 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import video2OcrTranslate as v2o
+
+
+def test_frames_sorted_numerically(tmp_path, monkeypatch):
+    # Oltre 9999 frame il numero ha 5 cifre: x-10000 va dopo x-9999, non dopo x-1000
+    for name in ("x-10000", "x-1001", "x-9999", "x.2024-0002", "cover"):
+        (tmp_path / f"{name}.png").write_bytes(b"")
+    monkeypatch.setitem(v2o.DIRS, "images", tmp_path)
+
+    assert [img.stem for img in v2o.video_frames("x")] == ["x-1001", "x-9999", "x-10000"]
+    assert [img.stem for img in sorted(tmp_path.glob("*.png"), key=v2o.frame_order)] == [
+        "cover", "x-1001", "x-9999", "x-10000", "x.2024-0002"]
@@ -0,0 +1,70 @@
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import video2OcrTranslate as v2o
+
+
+@pytest.fixture
+def stand_in():
+    # Server locale compatibile LibreTranslate: traduce in maiuscolo con il prefisso della lingua e registra le richieste
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            requests.append(body)
+            data = json.dumps({"translatedText": [f"<{body['target']}>{text.upper()}" for text in body["q"]]}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", requests
+    server.shutdown()
+    server.server_close()
+
+
+def test_batches_against_stand_in(tmp_path, monkeypatch, stand_in):
+    url, requests = stand_in
+    for name in ("ocr_output", "translated_output"):
+        (tmp_path / name).mkdir()
+        monkeypatch.setitem(v2o.DIRS, name, tmp_path / name)
+    # Il secondo frame ripete il primo a meno degli spazi, il quarto non ha testo
+    texts = {"x-0001": "Hello world", "x-0002": "Hello   world\n", "x-0003": "Goodbye", "x-0004": "", "x-0005": "Third text"}
+    for stem, text in texts.items():
+        (tmp_path / "ocr_output" / f"{stem}.txt").write_text(text, encoding="utf-8")
+    translation = v2o.TranslationService(v2o.TranslationCache(tmp_path / "cache.sqlite"), v2o.make_translator("libretranslate", url),
+                                         char_budget=20, concurrency=2, rate=0, retries=0, source_lang="en")
+
+    v2o.translate_texts("it", translation, "libretranslate")
+
+    # Tre testi distinti, divisi in blocchi da 20 caratteri: [Hello world] e [Goodbye, Third text]
+    assert sorted(request["q"] for request in requests) == [["Goodbye", "Third text"], ["Hello world"]]
+    assert all(request["source"] == "en" and request["target"] == "it" for request in requests)
+    translated = {stem: (tmp_path / "translated_output" / f"{stem}_it.txt").read_text(encoding="utf-8") for stem in texts}
+    assert translated == {"x-0001": "<it>HELLO WORLD", "x-0002": "<it>HELLO WORLD", "x-0003": "<it>GOODBYE",
+                          "x-0004": "", "x-0005": "<it>THIRD TEXT"}
+
+    # Seconda passata: tutto dalla cache delle traduzioni, nessuna richiesta
+    assert translation.translate(list(texts.values()), "it") == list(translated.values())
+    assert len(requests) == 2
+    assert not translation.failures
+    translation.close()
+
+
+def test_pack_batches_respects_budget():
+    batches = v2o.pack_batches(["a" * 8, "b" * 8, "c" * 30, "d"], 20)
+    assert batches == [["a" * 8, "b" * 8], ["c" * 30], ["d"]]
@@ -5,41 +5,117 @@
 # by Visi@n
 # LICENSE: MIT
 
+import io
 import os
+import re
 import sys
 import subprocess
 import shutil
+import json
 import zipfile
+import urllib.request
+import tempfile
 import hashlib
+import html
+import importlib.util
+import multiprocessing
 import csv
+import sqlite3
 import argparse
+import asyncio
+import random
+import threading
+import time
+import wave
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 import webbrowser
 from datetime import datetime
 import platform
 
-# Auto installa moduli mancanti
+# Auto installa moduli mancanti (openai-whisper solo quando serve, vedi ensure_whisper)
 try:
-    import whisper
+    from googletrans import Translator
 except ImportError:
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "openai-whisper"])
-    import whisper
+    try:
+        subprocess.check_call([sys.executable, "-m", "pip", "install", "googletrans==4.0.0-rc1"])
+        from googletrans import Translator
+    except (subprocess.CalledProcessError, ImportError):
+        # Postazioni senza rete: restano disponibili i traduttori offline (--translator argos/marian)
+        Translator = None
 
 try:
-    from googletrans import Translator
+    import numpy as np
+    from PIL import Image
 except ImportError:
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "googletrans==4.0.0-rc1"])
-    from googletrans import Translator
+    subprocess.check_call([sys.executable, "-m", "pip", "install", "numpy", "Pillow"])
+    import numpy as np
+    from PIL import Image
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+try:
+    import resource
+except ImportError:
+    # Windows: il picco di memoria nel benchmark Whisper non è disponibile
+    resource = None
 
 HOME = Path.home()
 WORKING_DIR = HOME / "02.computer_vision/04.video2ocr"
 DIRS = {
     "video": WORKING_DIR / "01.video",
     "images": WORKING_DIR / "02.images",
+    "thumbnails": WORKING_DIR / "03.thumbnails",
     "ocr_output": WORKING_DIR / "04.ocr_output",
-    "translated_output": WORKING_DIR / "05.translated_output"
+    "translated_output": WORKING_DIR / "05.translated_output",
+    "subtitles": WORKING_DIR / "07.subtitles"
 }
 ASCII_ART = "By Visi@n"
+OCR_BATCH_SIZE = 32
+REPORT_PAGE_SIZE = 200
+THUMBNAIL_WIDTH = 300
+REPORT_PREVIEW_CHARS = 300
+HASH_CHUNK_SIZE = 1024 * 1024
+HASH_ALGORITHMS = ["sha256"]
+HASH_WORKERS = min(8, os.cpu_count() or 1)
+TESSEROCR_STATE = threading.local()
+CPU_SLOTS = os.cpu_count() or 1
+CPU_BUDGET = threading.BoundedSemaphore(CPU_SLOTS)
+ARCHIVE_DIRS = [*DIRS.values(), WORKING_DIR / "06.audio"]
+# Formati già compressi: nell'archivio vengono solo memorizzati, il testo viene compresso
+ARCHIVE_STORED = {".png", ".jpg", ".jpeg", ".wav", ".mp3", ".mp4", ".mkv", ".avi", ".mov", ".webm", ".zip"}
+ARCHIVE_METHODS = {"deflate": zipfile.ZIP_DEFLATED, **({"zstd": zipfile.ZIP_ZSTANDARD} if hasattr(zipfile, "ZIP_ZSTANDARD") else {})}
+ARCHIVE_BUFFER = 8 * 1024 * 1024
+# Rilevamento delle regioni di testo: parametri sull'immagine ridotta a ROI_MAX_SIDE pixel di lato
+ROI_MAX_SIDE = 640
+ROI_EDGE = 48
+ROI_WINDOW = 12
+ROI_DENSITY = 0.25
+ROI_PADDING = 6
+ROI_MIN_HEIGHT = 32
+ROI_GAP = 16
+ROI_PSM = 6
+# Mosaico di frame: fascia bianca tra i riquadri e altezza massima (Tesseract rifiuta immagini oltre 32767 pixel)
+MONTAGE_GAP = 40
+MONTAGE_MAX_HEIGHT = 30000
+# Tracce di sottotitoli: le testuali vengono estratte direttamente, le bitmap (DVB/PGS/DVD) renderizzate e lette con l'OCR
+TEXT_SUBTITLE_CODECS = {"subrip", "srt", "ass", "ssa", "mov_text", "webvtt", "text"}
+BITMAP_SUBTITLE_CODECS = {"dvb_subtitle", "hdmv_pgs_subtitle", "dvd_subtitle", "xsub"}
+SUBTITLE_FRAMERATE = 4
+SRT_TIMING = re.compile(r"(\d+):(\d\d):(\d\d)[,.](\d{3})\s*-->\s*(\d+):(\d\d):(\d\d)[,.](\d{3})")
+# Prefiltro "niente testo": punteggio calcolato su una miniatura larga TEXT_SCORE_WIDTH pixel
+TEXT_SCORE_WIDTH = 480
+TEXT_THRESHOLDS = [0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005]
+TEXT_LABELS = {"1": True, "si": True, "sì": True, "yes": True, "true": True, "0": False, "no": False, "false": False}
+AUDIO_RATE = 16000
+WHISPER_MODEL = None
+WHISPER_BACKEND = "openai"
+WHISPER_BENCHMARK_MODELS = "tiny,base,small,medium,large"
 
 def check_dependencies():
     for cmd in ["ffmpeg", "tesseract"]:
@@ -51,145 +127,2036 @@ def get_installed_languages():
     output = subprocess.check_output(['tesseract', '--list-langs'], text=True)
     return output.splitlines()[1:]
 
+def hash_file(path, algorithms=None):
+    # Lettura a blocchi: anche i video da diversi GB non vengono mai caricati interi in memoria,
+    # e tutti gli algoritmi richiesti sono calcolati nella stessa passata
+    digests = [hashlib.new(name) for name in algorithms or HASH_ALGORITHMS]
+    with open(path, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            for digest in digests:
+                digest.update(chunk)
+    return [digest.hexdigest() for digest in digests]
+
+class ProvenanceLedger:
+    # Registro di provenienza: per ogni artefatto scritto dalla pipeline conserva i digest calcolati sui byte
+    # in memoria prima della scrittura, così i CSV degli hash e il manifest finale non rileggono i file dal disco
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def record(self, path, digests):
+        stat = path.stat()
+        with self.lock:
+            self.entries[path] = (stat.st_size, stat.st_mtime_ns, digests)
+
+    def write_bytes(self, path, data):
+        digests = [hashlib.new(name, data).hexdigest() for name in HASH_ALGORITHMS]
+        path.write_bytes(data)
+        self.record(path, digests)
+
+    def write_text(self, path, text):
+        self.write_bytes(path, text.encode("utf-8"))
+
+    def forget(self, path):
+        with self.lock:
+            self.entries.pop(path, None)
+
+    def digests(self, path):
+        # Un file modificato dopo la registrazione (dimensione o mtime diversi) va ricalcolato
+        entry = self.entries.get(path)
+        if entry is not None:
+            stat = path.stat()
+            if (stat.st_size, stat.st_mtime_ns) == entry[:2]:
+                return entry[2]
+        return None
+
+    def hash_files(self, files):
+        # File prodotti da strumenti esterni (ffmpeg, zip) o da esecuzioni precedenti: letti una sola volta
+        files = [file for file in files if file.is_file() and self.digests(file) is None]
+        # hashlib rilascia il GIL: più file vengono letti e calcolati in parallelo
+        with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+            for file, digests in zip(files, pool.map(hash_file, files)):
+                self.record(file, digests)
+
+LEDGER = ProvenanceLedger()
+
 def calculate_hashes(files, output_csv):
-    with open(output_csv, 'w', newline='') as f:
+    files = [file for file in files if file.is_file()]
+    LEDGER.hash_files(files)
+    with io.StringIO() as f:
         writer = csv.writer(f)
-        writer.writerow(["File", "SHA256"])
+        writer.writerow(["File", *(name.upper() for name in HASH_ALGORITHMS)])
         for file in files:
-            if file.is_file():
-                with open(file, 'rb') as x:
-                    writer.writerow([file.relative_to(WORKING_DIR), hashlib.sha256(x.read()).hexdigest()])
+            writer.writerow([file.relative_to(WORKING_DIR), *LEDGER.digests(file)])
+        LEDGER.write_text(output_csv, f.getvalue())
+
+def verify_hashes():
+    print("🔎 Verifica degli hash registrati...")
+    files = sorted(LEDGER.entries)
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+        current = list(pool.map(lambda file: hash_file(file) if file.is_file() else None, files))
+    mismatches = [file for file, digests in zip(files, current) if digests != LEDGER.entries[file][2]]
+    for file in mismatches:
+        print(f"   ❌ {file.relative_to(WORKING_DIR)}")
+    if mismatches:
+        print(f"❌ {len(mismatches)} file su {len(files)} non corrispondono agli hash registrati")
+    else:
+        print(f"✅ {len(files)} file verificati")
+    return not mismatches
+
+class StageCache:
+    # Cache delle fasi: chiave = digest dell'input + parametri; le voci completate non vengono rieseguite
+    def __init__(self):
+        self.db = None
+        self.force = False
+        self.lock = threading.Lock()
+
+    def open(self, path, force=False):
+        self.db = sqlite3.connect(str(path), check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS stages (stage TEXT, key TEXT, payload TEXT, PRIMARY KEY (stage, key))")
+        self.db.execute("CREATE TABLE IF NOT EXISTS file_digests (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT)")
+        self.force = force
+
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha256("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+    def get(self, stage, key):
+        if self.db is None or self.force:
+            return None
+        with self.lock:
+            row = self.db.execute("SELECT payload FROM stages WHERE stage = ? AND key = ?", (stage, key)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, stage, key, payload=None):
+        # Commit a ogni voce: un'esecuzione interrotta riprende dall'ultima voce completata
+        if self.db is None:
+            return
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO stages VALUES (?, ?, ?)", (stage, key, json.dumps(payload or {}, ensure_ascii=False)))
+            self.db.commit()
+
+    def file_digest(self, path):
+        # SHA-256 del contenuto, ricalcolato solo se dimensione o mtime cambiano
+        stat = path.stat()
+        if self.db is not None:
+            with self.lock:
+                row = self.db.execute("SELECT sha256 FROM file_digests WHERE path = ? AND size = ? AND mtime_ns = ?",
+                                      (str(path), stat.st_size, stat.st_mtime_ns)).fetchone()
+            if row:
+                return row[0]
+        digests = LEDGER.digests(path)
+        if digests is None:
+            # File non ancora nel registro (es. frame scritti da ffmpeg): una sola lettura calcola anche gli hash
+            # della catena di custodia, che write_stage_hashes trova già registrati
+            algorithms = HASH_ALGORITHMS + ([] if "sha256" in HASH_ALGORITHMS else ["sha256"])
+            computed = hash_file(path, algorithms)
+            LEDGER.record(path, computed[:len(HASH_ALGORITHMS)])
+            digest = computed[algorithms.index("sha256")]
+        else:
+            digest = digests[HASH_ALGORITHMS.index("sha256")] if "sha256" in HASH_ALGORITHMS else hash_file(path, ["sha256"])[0]
+        if self.db is not None:
+            with self.lock:
+                self.db.execute("INSERT OR REPLACE INTO file_digests VALUES (?, ?, ?, ?)", (str(path), stat.st_size, stat.st_mtime_ns, digest))
+                self.db.commit()
+        return digest
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+STAGES = StageCache()
+
+class FrameIndex:
+    # Indice temporale in index.sqlite: per ogni frame video, numero, tempo, testo OCR, confidenza e traduzione;
+    # per ogni video i segmenti Whisper. La vista timeline associa a ogni frame il segmento audio dello stesso istante
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS frames (frame TEXT PRIMARY KEY, video TEXT, frame_no INTEGER, timestamp REAL, representative TEXT,
+                                           ocr_text TEXT, confidence REAL, translation TEXT, translation_lang TEXT, text_score REAL);
+        CREATE INDEX IF NOT EXISTS frames_time ON frames (video, timestamp);
+        CREATE TABLE IF NOT EXISTS videos (video TEXT PRIMARY KEY, duration REAL);
+        CREATE TABLE IF NOT EXISTS segments (video TEXT, start_time REAL, end_time REAL, text TEXT, language TEXT);
+        CREATE INDEX IF NOT EXISTS segments_time ON segments (video, start_time);
+        CREATE TABLE IF NOT EXISTS subtitles (video TEXT, track INTEGER, start_time REAL, end_time REAL, text TEXT, language TEXT, translation TEXT);
+        CREATE INDEX IF NOT EXISTS subtitles_time ON subtitles (video, start_time);
+        CREATE VIEW IF NOT EXISTS timeline AS
+            SELECT f.video, f.frame_no, f.timestamp, r.ocr_text, r.translation, r.confidence,
+                   (SELECT s.text FROM segments s WHERE s.video = f.video AND s.start_time <= f.timestamp AND s.end_time > f.timestamp
+                    ORDER BY s.start_time DESC LIMIT 1) AS audio_segment
+            FROM frames f JOIN frames r ON r.frame = COALESCE(f.representative, f.frame);
+    """
+    # Indice full-text (FTS5) su testo OCR e traduzione, aggiornato dai trigger a ogni scrittura in frames
+    FTS_SCHEMA = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS frames_fts USING fts5(ocr_text, translation, content='frames', content_rowid='rowid',
+                                                                  tokenize='unicode61 remove_diacritics 2');
+        CREATE TRIGGER IF NOT EXISTS frames_fts_insert AFTER INSERT ON frames BEGIN
+            INSERT INTO frames_fts (rowid, ocr_text, translation) VALUES (new.rowid, new.ocr_text, new.translation);
+        END;
+        CREATE TRIGGER IF NOT EXISTS frames_fts_delete AFTER DELETE ON frames BEGIN
+            INSERT INTO frames_fts (frames_fts, rowid, ocr_text, translation) VALUES ('delete', old.rowid, old.ocr_text, old.translation);
+        END;
+        CREATE TRIGGER IF NOT EXISTS frames_fts_update AFTER UPDATE OF ocr_text, translation ON frames BEGIN
+            INSERT INTO frames_fts (frames_fts, rowid, ocr_text, translation) VALUES ('delete', old.rowid, old.ocr_text, old.translation);
+            INSERT INTO frames_fts (rowid, ocr_text, translation) VALUES (new.rowid, new.ocr_text, new.translation);
+        END;
+    """
+
+    def __init__(self):
+        self.db = None
+        self.lock = threading.Lock()
+
+    def open(self, path):
+        self.db = sqlite3.connect(str(path), check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(self.SCHEMA)
+        # Indice creato da una versione precedente senza il punteggio del prefiltro
+        if "text_score" not in [row[1] for row in self.db.execute("PRAGMA table_info(frames)")]:
+            self.db.execute("ALTER TABLE frames ADD COLUMN text_score REAL")
+        # Indice creato da una versione precedente senza FTS: la tabella full-text viene popolata una volta sola
+        rebuild = not self.db.execute("SELECT 1 FROM sqlite_master WHERE name = 'frames_fts'").fetchone()
+        self.db.executescript(self.FTS_SCHEMA)
+        if rebuild:
+            self.db.execute("INSERT INTO frames_fts (frames_fts) VALUES ('rebuild')")
+            self.db.commit()
+
+    def execute(self, sql, rows):
+        if self.db is None:
+            return
+        with self.lock:
+            self.db.executemany(sql, rows)
+            self.db.commit()
+
+    @staticmethod
+    def split(frame):
+        # Nome del frame senza estensione (<video>-<numero>): niente Path, che taglierebbe i nomi video con un punto
+        video, number = frame.rsplit("-", 1)
+        return video, int(number)
+
+    def put_frames(self, rows):
+        # rows: (frame, secondi)
+        self.execute("INSERT INTO frames (frame, video, frame_no, timestamp) VALUES (?, ?, ?, ?) "
+                     "ON CONFLICT (frame) DO UPDATE SET timestamp = excluded.timestamp",
+                     [(frame, *self.split(frame), seconds) for frame, seconds in rows])
+
+    def put_video(self, video, duration):
+        self.execute("INSERT OR REPLACE INTO videos VALUES (?, ?)", [(video, duration)])
+
+    def put_ocr(self, frame, text, confidence, score=None):
+        # text=None: frame scartato dal prefiltro (punteggio sotto soglia), OCR non eseguito
+        self.execute("INSERT INTO frames (frame, video, frame_no, ocr_text, confidence, text_score) VALUES (?, ?, ?, ?, ?, ?) "
+                     "ON CONFLICT (frame) DO UPDATE SET ocr_text = excluded.ocr_text, confidence = excluded.confidence, "
+                     "text_score = COALESCE(excluded.text_score, text_score)",
+                     [(frame, *self.split(frame), text, confidence, score)])
+
+    def drop_frames(self, video):
+        self.execute("DELETE FROM frames WHERE video = ?", [(video,)])
+
+    def skipped(self):
+        # {frame: punteggio} dei frame scartati dal prefiltro
+        if self.db is None:
+            return {}
+        with self.lock:
+            return dict(self.db.execute("SELECT frame, text_score FROM frames WHERE ocr_text IS NULL AND text_score IS NOT NULL"))
+
+    def put_translation(self, frame, lang, text):
+        self.execute("UPDATE frames SET translation = ?, translation_lang = ? WHERE frame = ?", [(text, lang, frame)])
+
+    def put_duplicates(self, groups):
+        # groups: {frame.png: rappresentativo.png}; i duplicati mostrano testo e traduzione del rappresentativo
+        self.execute("UPDATE frames SET representative = ? WHERE frame = ?",
+                     [(None if rep == name else Path(rep).stem, Path(name).stem) for name, rep in groups.items()])
+
+    def put_segments(self, video, segments, language=None):
+        if self.db is None:
+            return
+        with self.lock:
+            self.db.execute("DELETE FROM segments WHERE video = ?", (video,))
+            self.db.executemany("INSERT INTO segments VALUES (?, ?, ?, ?, ?)",
+                                [(video, segment["start"], segment["end"], segment["text"], language) for segment in segments])
+            self.db.commit()
+
+    def put_subtitles(self, video, track, cues, language=None, translations=None):
+        if self.db is None:
+            return
+        with self.lock:
+            self.db.execute("DELETE FROM subtitles WHERE video = ? AND track = ?", (video, track))
+            self.db.executemany("INSERT INTO subtitles VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                [(video, track, cue["start"], cue["end"], cue["text"], language, translation)
+                                 for cue, translation in zip(cues, translations or [None] * len(cues))])
+            self.db.commit()
+
+    def lookup(self, seconds, video=None):
+        # Per ogni video l'ultimo frame estratto non oltre `seconds` (quello visibile in quell'istante), i segmenti audio
+        # e i sottotitoli in corso. Il frame vale fino al successivo e l'ultimo fino alla fine del video: un video più
+        # corto di `seconds` non dà risultati (senza durata registrata, l'ultimo frame vale solo per il suo istante)
+        video_filter = "" if video is None else " AND video = ?"
+        params = (seconds,) if video is None else (seconds, video)
+        with self.lock:
+            frames = self.db.execute(
+                "SELECT f.video, f.frame, f.timestamp, r.ocr_text, r.translation, r.confidence FROM "
+                f"(SELECT video, MAX(timestamp) AS timestamp FROM frames WHERE timestamp <= ?{video_filter} GROUP BY video) last "
+                "JOIN frames f ON f.video = last.video AND f.timestamp = last.timestamp "
+                "JOIN frames r ON r.frame = COALESCE(f.representative, f.frame) "
+                "LEFT JOIN videos v ON v.video = f.video "
+                "WHERE EXISTS (SELECT 1 FROM frames n WHERE n.video = f.video AND n.timestamp > f.timestamp) "
+                "OR ? < v.duration OR ? = f.timestamp ORDER BY f.video", params + (seconds, seconds)).fetchall()
+            segments = self.db.execute(f"SELECT video, start_time, end_time, text FROM segments WHERE start_time <= ? AND end_time > ?{video_filter} "
+                                       "ORDER BY video, start_time", (seconds,) + params).fetchall()
+            subtitles = self.db.execute("SELECT video, track, start_time, end_time, text, translation FROM subtitles "
+                                        f"WHERE start_time <= ? AND end_time > ?{video_filter} ORDER BY video, track", (seconds,) + params).fetchall()
+        return frames, segments, subtitles
+
+    def search(self, query, video=None, limit=50):
+        # Solo i rappresentativi hanno testo: per ognuno anche l'ultimo istante in cui il duplicato resta a schermo
+        video_filter = "" if video is None else " AND f.video = ?"
+        params = (query,) + (() if video is None else (video,)) + (limit,)
+        with self.lock:
+            return self.db.execute(
+                "SELECT f.video, f.frame, f.timestamp, (SELECT MAX(d.timestamp) FROM frames d WHERE d.representative = f.frame), "
+                "snippet(frames_fts, -1, '[', ']', '…', 12) FROM frames_fts JOIN frames f ON f.rowid = frames_fts.rowid "
+                f"WHERE frames_fts MATCH ?{video_filter} ORDER BY f.video, f.timestamp LIMIT ?", params).fetchall()
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+INDEX = FrameIndex()
+
+def fts_query(text):
+    # Ogni parola tra virgolette: numeri di telefono, email e punteggiatura non vengono letti come sintassi FTS5.
+    # Un * finale resta una ricerca per prefisso
+    terms = []
+    for term in text.split():
+        prefix = term.endswith("*") and len(term) > 1
+        term = term.rstrip("*") if prefix else term
+        terms.append('"' + term.replace('"', '""') + '"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+def print_search(text, video=None, limit=50):
+    start = time.perf_counter()
+    results = INDEX.search(fts_query(text), video, limit)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"🔎 \"{text}\": {len(results)} frame in {elapsed:.1f} ms")
+    for video_name, frame, timestamp, until, snippet in results:
+        when = "" if timestamp is None else format_timestamp(timestamp)
+        if until is not None and timestamp is not None and until > timestamp:
+            when += f" → {format_timestamp(until)}"
+        print(f"🖼️ {video_name} · {frame} ({when}): {' '.join(snippet.split())}")
+
+def parse_time(value):
+    # HH:MM:SS(.mmm), MM:SS oppure secondi
+    seconds = 0.0
+    for part in value.split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+def print_lookup(seconds, video=None):
+    frames, segments, subtitles = INDEX.lookup(seconds, video)
+    print(f"🔎 {format_timestamp(seconds)}")
+    for video_name, frame, timestamp, text, translation, confidence in frames:
+        conf = "" if confidence is None else f", confidenza {confidence:.0f}"
+        print(f"🖼️ {video_name} · {frame} ({format_timestamp(timestamp)}{conf})")
+        if text and text.strip():
+            print(f"   OCR: {' '.join(text.split())}")
+        if translation and translation.strip():
+            print(f"   Traduzione: {' '.join(translation.split())}")
+    for video_name, start, end, text in segments:
+        print(f"🎧 {video_name} · {format_timestamp(start)} → {format_timestamp(end)}: {text}")
+    for video_name, track, start, end, text, translation in subtitles:
+        print(f"💬 {video_name} · traccia {track} · {format_timestamp(start)} → {format_timestamp(end)}: {' '.join(text.split())}")
+        if translation and translation.strip():
+            print(f"   Traduzione: {' '.join(translation.split())}")
+    if not frames and not segments and not subtitles:
+        print("❌ Nessun frame o segmento audio in quell'istante")
+
+def tesseract_version():
+    output = subprocess.run(["tesseract", "--version"], capture_output=True, text=True)
+    return (output.stdout or output.stderr).strip().split("\n")[0]
 
 def ensure_directories():
     for d in DIRS.values():
         d.mkdir(parents=True, exist_ok=True)
 
-def extract_frames(framerate, timestamp):
-    print("🎞️ Estrazione frame da video...")
-    for video in DIRS["video"].glob("*"):
+def format_timestamp(seconds):
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{seconds:06.3f}"
+
+def parse_showinfo_times(stderr):
+    return [float(m.group(1)) for m in re.finditer(r"Parsed_showinfo.*?pts_time:\s*(-?[\d.]+)", stderr)]
+
+def frame_number(img):
+    return int(img.stem.rsplit("-", 1)[1])
+
+def write_frame_timestamps(video, times):
+    with io.StringIO() as f:
+        writer = csv.writer(f)
+        writer.writerow(["Frame", "Timestamp", "Time"])
+        rows = [(img, times[frame_number(img) - 1]) for img in video_frames(video.stem) if frame_number(img) <= len(times)]
+        for img, seconds in rows:
+            writer.writerow([img.name, f"{seconds:.3f}", format_timestamp(seconds)])
+        LEDGER.write_text(DIRS["images"] / f"{video.stem}.timestamps.csv", f.getvalue())
+    # Nell'indice tutti i frame, anche quelli senza testo che in streaming non vengono salvati su disco:
+    # --at non deve restituire il testo di un frame precedente durante un tratto vuoto
+    INDEX.put_frames([(f"{video.stem}-{n:04d}", seconds) for n, seconds in enumerate(times, 1)])
+    INDEX.put_video(video.stem, probe_duration(video))
+
+def probe_duration(video):
+    output = subprocess.run(["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=nw=1:nk=1", str(video)],
+                            capture_output=True, text=True).stdout.strip()
+    try:
+        return float(output)
+    except ValueError:
+        return None
+
+def load_frame_timestamps(video=None):
+    # Con video solo il suo CSV: quelli degli altri video possono essere in riscrittura nei rispettivi thread
+    timestamps = {}
+    csv_files = [DIRS["images"] / f"{video.stem}.timestamps.csv"] if video is not None else DIRS["images"].glob("*.timestamps.csv")
+    for csv_file in csv_files:
+        if not csv_file.exists():
+            continue
+        with open(csv_file, newline="") as f:
+            for row in csv.DictReader(f):
+                timestamps[row["Frame"]] = float(row["Timestamp"])
+    return timestamps
+
+def ffmpeg_frame_args(framerate, mode="fixed", scene_threshold=0.3, min_interval=0.5, max_interval=10.0):
+    if mode == "fixed":
+        return [], ["-r", str(framerate)]
+    if mode == "scene":
+        select = (f"isnan(prev_selected_t)+gte(t-prev_selected_t,{max_interval})"
+                  f"+gt(scene,{scene_threshold})*gte(t-prev_selected_t,{min_interval})")
+        return [], ["-vf", f"select='{select}',showinfo", "-vsync", "vfr"]
+    # Con -skip_frame nokey vengono decodificati solo i keyframe: max_interval non è applicabile
+    select = f"isnan(prev_selected_t)+gte(t-prev_selected_t,{min_interval})"
+    return ["-skip_frame", "nokey"], ["-vf", f"select='{select}',showinfo", "-vsync", "vfr"]
+
+def extract_frames(framerate, mode="fixed", scene_threshold=0.3, min_interval=0.5, max_interval=10.0, videos=None):
+    print(f"🎞️ Estrazione frame da video (modalità: {mode})...")
+    for video in DIRS["video"].glob("*") if videos is None else videos:
+        key = STAGES.key(video.stem, STAGES.file_digest(video), framerate, mode, scene_threshold, min_interval, max_interval)
+        done = STAGES.get("extract", key)
+        if done is not None and all((DIRS["images"] / name).exists() for name in done["files"]):
+            print(f"⏭️ {video.name}: frame già estratti")
+            continue
+        clear_frames(video)
         out_pattern = DIRS["images"] / f"{video.stem}-%04d.png"
-        subprocess.run(f'ffmpeg -i "{video}" -r {framerate} -f image2 "{out_pattern}"', shell=True)
+        input_args, output_args = ffmpeg_frame_args(framerate, mode, scene_threshold, min_interval, max_interval)
+        cmd = ["ffmpeg", "-nostdin", *input_args, "-i", str(video), *output_args, "-f", "image2", str(out_pattern)]
+        if mode == "fixed":
+            with CPU_BUDGET:
+                result = subprocess.run(cmd)
+            # Estrazione fallita o parziale: niente cache, alla prossima esecuzione il video viene riestratto
+            if result.returncode != 0:
+                print(f"⚠️ ffmpeg ha fallito su {video.name} (codice {result.returncode})")
+                continue
+            write_frame_timestamps(video, [n / framerate for n in range(len(video_frames(video.stem)))])
+        else:
+            with CPU_BUDGET:
+                result = subprocess.run(cmd, capture_output=True, text=True, errors="replace")
+            if result.returncode != 0:
+                print(f"⚠️ ffmpeg ha fallito su {video.name}: {result.stderr.strip().splitlines()[-1:]}")
+                continue
+            write_frame_timestamps(video, parse_showinfo_times(result.stderr))
+        STAGES.put("extract", key, {"files": [img.name for img in video_frames(video.stem)] + [f"{video.stem}.timestamps.csv"]})
     print("✅ Frame estratti")
-    calculate_hashes(list(DIRS["images"].glob("*.png")), WORKING_DIR / f"hash-images-{timestamp}.csv")
 
-def run_ocr(lang, timestamp):
-    print("🔍 OCR in corso...")
-    for img in DIRS["images"].glob("*.png"):
-        output = DIRS["ocr_output"] / img.name.replace(".png", "")
-        subprocess.run(f'tesseract -l {lang} "{img}" "{output}"', shell=True)
+def frame_video(img):
+    return img.stem.rsplit("-", 1)[0]
+
+def frame_order(img):
+    # Ordine per video e numero del frame (x-1001 prima di x-10000); i PNG con altri nomi in coda al loro nome
+    video, _, number = img.stem.rpartition("-")
+    return (video, int(number)) if video and number.isdigit() else (img.stem, 0)
+
+def video_frames(stem):
+    return sorted((img for img in DIRS["images"].glob("*.png") if frame_video(img) == stem), key=frame_order)
+
+def clear_frames(video):
+    # Estrazione da rifare (parametri cambiati): i frame precedenti e i loro testi, traduzioni e miniature
+    # verrebbero altrimenti mescolati a quelli nuovi, con numeri e tempi sbagliati
+    stems = {img.stem for img in video_frames(video.stem)}
+    derived = [*DIRS["ocr_output"].glob("*.txt"), *DIRS["translated_output"].glob("*.txt"), *DIRS["thumbnails"].glob("*.jpg")]
+    for path in [*video_frames(video.stem), *(path for path in derived if path.stem in stems or path.stem.rsplit("_", 1)[0] in stems)]:
+        path.unlink(missing_ok=True)
+        LEDGER.forget(path)
+    INDEX.drop_frames(video.stem)
+
+def thumbnail_pixels(im, size):
+    return np.asarray(im.convert("L").resize(size, Image.BILINEAR), dtype=np.int16)
+
+def load_thumbnail(img, size):
+    with Image.open(img) as im:
+        return thumbnail_pixels(im, size)
+
+def dhash_pixels(pixels):
+    bits = pixels[:, :, 1:] > pixels[:, :, :-1]
+    return np.packbits(bits.reshape(len(pixels), -1), axis=1).view(">u8").ravel()
+
+def dhash_frames(images, workers=1, hash_size=8):
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return dhash_pixels(np.stack(list(pool.map(lambda img: load_thumbnail(img, (hash_size + 1, hash_size)), images))))
+
+def write_dedup_csv(rows, timestamp):
+    with io.StringIO() as f:
+        writer = csv.writer(f)
+        writer.writerow(["Frame", "Representative", "Hamming", "dHash"])
+        writer.writerows(rows)
+        LEDGER.write_text(WORKING_DIR / f"dedup-{timestamp}.csv", f.getvalue())
+    reps = len({row[1] for row in rows})
+    print(f"✅ {len(rows)} frame → {reps} rappresentativi ({len(rows) / reps if reps else 0:.1f}x)")
+
+def dedup_frames(threshold, workers=1, images=None):
+    print(f"🧬 Deduplicazione frame (soglia Hamming: {threshold})...")
+    if images is None:
+        images = sorted(DIRS["images"].glob("*.png"), key=frame_order)
+    groups, rows = {}, []
+    if not images:
+        return groups, rows
+    # dHash già calcolati in esecuzioni precedenti: la miniatura viene ricaricata solo per i frame nuovi
+    keys = [STAGES.file_digest(img) for img in images]
+    hashes = [STAGES.get("dhash", key) for key in keys]
+    missing = [i for i, h in enumerate(hashes) if h is None]
+    for i, h in zip(missing, dhash_frames([images[i] for i in missing], workers) if missing else []):
+        hashes[i] = {"dhash": int(h)}
+        STAGES.put("dhash", keys[i], hashes[i])
+    rep = rep_hash = None
+    for img, h in zip(images, (h["dhash"] for h in hashes)):
+        distance = bin(h ^ rep_hash).count("1") if rep is not None and frame_video(img) == frame_video(rep) else None
+        if distance is None or distance > threshold:
+            rep, rep_hash, distance = img, h, 0
+        groups[img.name] = rep.name
+        rows.append([img.relative_to(WORKING_DIR).as_posix(), rep.relative_to(WORKING_DIR).as_posix(), distance, f"{h:016x}"])
+    return groups, rows
+
+def tesseract_source(img):
+    if isinstance(img, Path):
+        return str(img), None
+    # Frame in memoria: passato a Tesseract su stdin in formato PPM (nessuna compressione)
+    buffer = io.BytesIO()
+    img.save(buffer, format="PPM")
+    return "stdin", buffer.getvalue()
+
+def tsv_confidence(tsv):
+    # Confidenza media (0-100) delle parole riconosciute, per pagina: nel batch ogni immagine è una pagina
+    words = {}
+    for row in csv.DictReader(io.StringIO(tsv), delimiter="\t", quoting=csv.QUOTE_NONE):
+        if row.get("level") == "5" and (row.get("text") or "").strip() and float(row.get("conf") or -1) >= 0:
+            words.setdefault(int(row["page_num"]), []).append(float(row["conf"]))
+    return {page: sum(confs) / len(confs) for page, confs in words.items()}
+
+def read_tesseract_output(base):
+    text = Path(f"{base}.txt").read_text(encoding="utf-8", errors="replace") if Path(f"{base}.txt").exists() else ""
+    tsv = Path(f"{base}.tsv").read_text(encoding="utf-8", errors="replace") if Path(f"{base}.tsv").exists() else ""
+    return text, tsv_confidence(tsv)
+
+def psm_args(psm):
+    return ["--psm", str(psm)] if psm is not None else []
+
+def ocr_subprocess(images, lang, psm=None):
+    # Testo e TSV (con la confidenza per parola) prodotti dalla stessa esecuzione di Tesseract
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Path(tmp) / "ocr"
+        for img in images:
+            source, data = tesseract_source(img)
+            result = subprocess.run(["tesseract", "-l", lang, *psm_args(psm), source, str(base), "txt", "tsv"], input=data, capture_output=True)
+            if result.returncode != 0:
+                print(f"⚠️ Tesseract ha fallito su {getattr(img, 'name', source)}: {result.stderr.decode('utf-8', 'replace').strip()}")
+            text, confidence = read_tesseract_output(base)
+            results.append((text, confidence.get(1)))
+            for suffix in (".txt", ".tsv"):
+                Path(f"{base}{suffix}").unlink(missing_ok=True)
+    return results
+
+def ocr_tesserocr(images, lang, psm=None):
+    # Una sola istanza dell'API (e quindi un solo caricamento del traineddata) per thread
+    api = getattr(TESSEROCR_STATE, "api", None)
+    if api is None:
+        api = TESSEROCR_STATE.api = tesserocr.PyTessBaseAPI(lang=lang)
+    api.SetPageSegMode(tesserocr.PSM.AUTO if psm is None else psm)
+    results = []
+    for img in images:
+        if isinstance(img, Path):
+            api.SetImageFile(str(img))
+        else:
+            api.SetImage(img)
+        text = api.GetUTF8Text()
+        results.append((text, api.MeanTextConf() if text.strip() else None))
+    return results
+
+def ocr_batch(images, lang, psm=None):
+    # Un solo processo Tesseract per blocco: l'input è un file con l'elenco delle immagini
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for n, img in enumerate(images):
+            # Immagini in memoria (ritagli delle regioni di testo): salvate nella cartella temporanea
+            if not isinstance(img, Path):
+                img.save(Path(tmp) / f"{n}.png", compress_level=1)
+                img = Path(tmp) / f"{n}.png"
+            paths.append(img)
+        listing = Path(tmp) / "images.txt"
+        listing.write_text("\n".join(str(img) for img in paths) + "\n", encoding="utf-8")
+        base = Path(tmp) / "ocr"
+        result = subprocess.run(["tesseract", "-l", lang, *psm_args(psm), str(listing), str(base), "txt", "tsv"], capture_output=True)
+        text, confidence = read_tesseract_output(base)
+    pages = text.split("\f")
+    if len(pages) == len(images) + 1 and not pages[-1].strip():
+        pages.pop()
+    if result.returncode != 0 or len(pages) != len(images):
+        print(f"⚠️ Output batch di Tesseract non allineato ({len(pages)}/{len(images)} pagine), ripiego su subprocess")
+        return ocr_subprocess(images, lang, psm)
+    return [(page, confidence.get(n)) for n, page in enumerate(pages, 1)]
+
+def read_montage(tiles, lang, psm=None):
+    canvas = Image.new("L", (max(tile.width for tile in tiles) + 2 * MONTAGE_GAP,
+                             sum(tile.height for tile in tiles) + MONTAGE_GAP * (len(tiles) + 1)), 255)
+    # Limite inferiore della zona di ogni riquadro: metà della fascia bianca che lo segue
+    bounds, y = [], MONTAGE_GAP
+    for tile in tiles:
+        canvas.paste(tile, (MONTAGE_GAP, y))
+        y += tile.height + MONTAGE_GAP
+        bounds.append(y - MONTAGE_GAP // 2)
+    source, data = tesseract_source(canvas)
+    result = subprocess.run(["tesseract", "-l", lang, *psm_args(psm), source, "stdout", "tsv"], input=data, capture_output=True)
+    if result.returncode != 0:
+        print(f"⚠️ Tesseract ha fallito sul mosaico ({result.stderr.decode('utf-8', 'replace').strip()}), ripiego su subprocess")
+        return ocr_subprocess(tiles, lang, psm)
+    # Ogni parola va al riquadro che contiene il centro del suo bounding box; righe e paragrafi nell'ordine del TSV
+    lines = [{} for _ in tiles]
+    confidences = [[] for _ in tiles]
+    for row in csv.DictReader(io.StringIO(result.stdout.decode("utf-8", "replace")), delimiter="\t", quoting=csv.QUOTE_NONE):
+        if row.get("level") != "5" or not (row.get("text") or "").strip():
+            continue
+        n = min(int(np.searchsorted(bounds, int(row["top"]) + int(row["height"]) / 2, side="right")), len(tiles) - 1)
+        lines[n].setdefault((int(row["block_num"]), int(row["par_num"]), int(row["line_num"])), []).append(row["text"])
+        if float(row["conf"]) >= 0:
+            confidences[n].append(float(row["conf"]))
+    results = []
+    for tile_lines, confs in zip(lines, confidences):
+        text, paragraph = "", None
+        for (block, par, _), words in tile_lines.items():
+            if paragraph is not None and paragraph != (block, par):
+                text += "\n"
+            text += " ".join(words) + "\n"
+            paragraph = (block, par)
+        results.append((text, sum(confs) / len(confs) if confs else None))
+    return results
+
+def ocr_montage(images, lang, psm=None):
+    # Frame (o ritagli delle regioni) impilati in un mosaico separato da fasce bianche: il costo di avvio
+    # di Tesseract si paga una volta per mosaico invece che per frame
+    tiles = []
+    for img in images:
+        if isinstance(img, Path):
+            with Image.open(img) as im:
+                tiles.append(im.convert("L"))
+        else:
+            tiles.append(img.convert("L"))
+    results, start = [], 0
+    while start < len(tiles):
+        end, height = start + 1, tiles[start].height + 2 * MONTAGE_GAP
+        while end < len(tiles) and height + tiles[end].height + MONTAGE_GAP <= MONTAGE_MAX_HEIGHT:
+            height += tiles[end].height + MONTAGE_GAP
+            end += 1
+        results += read_montage(tiles[start:end], lang, psm)
+        start = end
+    return results
+
+OCR_BACKENDS = {"subprocess": ocr_subprocess, "tesserocr": ocr_tesserocr, "batch": ocr_batch, "montage": ocr_montage}
+
+def parse_roi(value):
+    try:
+        roi = tuple(float(v) for v in value.split(","))
+    except ValueError:
+        roi = ()
+    if len(roi) != 4 or min(roi) < 0:
+        raise argparse.ArgumentTypeError(f"ROI non valida: {value} (formato x,y,w,h)")
+    return roi
+
+def roi_box(roi, size):
+    # ROI in pixel, oppure in frazioni del frame se tutti i valori sono ≤ 1 (es. 0,0.8,1,0.2 = fascia dei sottotitoli)
+    x, y, w, h = roi
+    if max(roi) <= 1:
+        x, y, w, h = x * size[0], y * size[1], w * size[0], h * size[1]
+    return max(0, round(x)), max(0, round(y)), min(size[0], round(x + w)), min(size[1], round(y + h))
+
+def active_runs(flags, gap):
+    # Intervalli [inizio, fine) dei valori veri, uniti se separati da al massimo gap valori falsi
+    idx = np.flatnonzero(flags)
+    if not idx.size:
+        return []
+    breaks = np.flatnonzero(np.diff(idx) > gap + 1)
+    starts = np.r_[idx[0], idx[breaks + 1]]
+    ends = np.r_[idx[breaks], idx[-1]] + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+def dense_edges(pixels):
+    # Finestre orizzontali di ROI_WINDOW pixel in cui almeno ROI_DENSITY delle transizioni chiaro/scuro sono marcate
+    edges = np.abs(np.diff(pixels, axis=1)) > ROI_EDGE
+    window = min(ROI_WINDOW, edges.shape[1])
+    if window < 1:
+        return None, window
+    sums = np.cumsum(np.pad(edges, ((0, 0), (1, 0))), axis=1, dtype=np.int32)
+    return (sums[:, window:] - sums[:, :-window]) >= window * ROI_DENSITY, window
+
+def text_score(image):
+    # Probabilità di testo (0-1): frazione della miniatura coperta da finestre dense di bordi. Frame neri, sfumati,
+    # transizioni e riprese senza scritte restano vicini a 0; pochi millisecondi contro una chiamata a Tesseract
+    width = min(TEXT_SCORE_WIDTH, image.width)
+    dense, _ = dense_edges(thumbnail_pixels(image, (width, max(1, round(image.height * width / image.width)))))
+    return float(dense.mean()) if dense is not None and dense.size else 0.0
+
+def load_text_score(img):
+    with Image.open(img) as im:
+        return text_score(im)
+
+def calibrate_text_threshold(labels_csv, timestamp, threshold=None):
+    # Campione etichettato (frame, testo sì/no): per ogni soglia quanti frame con testo verrebbero persi
+    # e quanti frame senza testo verrebbero risparmiati a Tesseract
+    samples = []
+    with open(labels_csv, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if len(row) < 2 or row[1].strip().lower() not in TEXT_LABELS:
+                continue
+            frame = Path(row[0].strip())
+            if not frame.exists():
+                frame = DIRS["images"] / frame
+            if not frame.exists():
+                print(f"⚠️ Frame non trovato: {row[0]}")
+                continue
+            samples.append((frame, TEXT_LABELS[row[1].strip().lower()]))
+    if not samples:
+        print(f"❌ Nessun frame etichettato in {labels_csv} (colonne: frame, testo 1/0)")
+        return None
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+        scores = list(pool.map(load_text_score, [frame for frame, _ in samples]))
+    text_scores = [score for score, (_, label) in zip(scores, samples) if label]
+    blank = len(samples) - len(text_scores)
+    print(f"🎯 Calibrazione del prefiltro su {len(samples)} frame ({len(text_scores)} con testo, {blank} senza)")
+    for t in sorted(set(TEXT_THRESHOLDS + ([threshold] if threshold is not None else []))):
+        missed = sum(score < t for score in text_scores)
+        saved = sum(score < t for score, (_, label) in zip(scores, samples) if not label)
+        print(f"   soglia {t:.4f}: {missed}/{len(text_scores)} frame con testo persi, {saved}/{blank} frame senza testo saltati"
+              + (" ◀ --text-threshold" if t == threshold else ""))
+    if text_scores:
+        print(f"💡 Soglia più alta che non perde frame con testo: {min(text_scores):.4f}")
+    output_csv = WORKING_DIR / f"text-calibration-{timestamp}.csv"
+    with io.StringIO() as f:
+        writer = csv.writer(f)
+        writer.writerow(["Frame", "Text", "Score"])
+        writer.writerows([frame, int(label), f"{score:.6f}"] for (frame, label), score in zip(samples, scores))
+        LEDGER.write_text(output_csv, f.getvalue())
+    print(f"✅ Punteggi salvati in {output_csv}")
+    return output_csv
+
+def find_text_regions(gray, box=None):
+    # Densità dei bordi su un'immagine ridotta: i tratti dei caratteri producono molte transizioni chiaro/scuro
+    # ravvicinate in orizzontale, lo sfondo uniforme o sfumato quasi nessuna. Le righe dense formano fasce,
+    # le colonne dense di ogni fascia i riquadri, riportati poi alle coordinate del frame
+    x0, y0 = box[:2] if box else (0, 0)
+    if box:
+        gray = gray.crop(box)
+    scale = max(1, -(-max(gray.size) // ROI_MAX_SIDE))
+    dense, window = dense_edges(np.asarray(gray.reduce(scale) if scale > 1 else gray, dtype=np.int16))
+    if dense is None:
+        return []
+    boxes = []
+    for top, bottom in active_runs(dense.sum(axis=1) >= 2, 1):
+        if bottom - top < 3:
+            continue
+        for left, right in active_runs(dense[top:bottom].any(axis=0), window):
+            pad = ROI_PADDING * scale
+            boxes.append((x0 + max(0, left * scale - pad), y0 + max(0, top * scale - pad),
+                          x0 + min(gray.width, (right + window) * scale + pad), y0 + min(gray.height, bottom * scale + pad)))
+    return boxes
+
+def binarize(crop):
+    # Soglia di Otsu sull'istogramma del ritaglio; il testo (la classe minoritaria) diventa nero su bianco
+    if crop.height < ROI_MIN_HEIGHT:
+        crop = crop.resize((crop.width * 2, crop.height * 2), Image.LANCZOS)
+    pixels = np.asarray(crop)
+    hist = np.bincount(pixels.ravel(), minlength=256).astype(np.float64)
+    weights, means = np.cumsum(hist), np.cumsum(hist * np.arange(256))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (means[-1] * weights - means * weights[-1]) ** 2 / (weights * (weights[-1] - weights))
+    bright = pixels > int(np.argmax(np.nan_to_num(between)))
+    return Image.fromarray(np.where(bright == (bright.mean() < 0.5), 0, 255).astype(np.uint8))
+
+def region_image(image, regions):
+    # Ritagli delle regioni con testo (in tutto il frame o dentro le ROI fisse), binarizzati e impilati in un'unica
+    # immagine: Tesseract analizza solo questi pixel invece dell'intero frame. None se il frame non ha testo
+    gray = image.convert("L")
+    if regions == "auto":
+        boxes = find_text_regions(gray)
+    else:
+        rois = [roi_box(roi, gray.size) for roi in regions]
+        boxes = [box for roi in rois if roi[2] > roi[0] and roi[3] > roi[1] for box in find_text_regions(gray, roi)]
+    crops = [binarize(gray.crop(box)) for box in boxes]
+    if not crops:
+        return None
+    canvas = Image.new("L", (max(crop.width for crop in crops) + 2 * ROI_GAP,
+                             sum(crop.height for crop in crops) + ROI_GAP * (len(crops) + 1)), 255)
+    y = ROI_GAP
+    for crop in crops:
+        canvas.paste(crop, (ROI_GAP, y))
+        y += crop.height + ROI_GAP
+    return canvas
+
+def ocr_regions(recognize, images, lang, regions):
+    # Una sola immagine per frame con tutte le sue regioni, letta come blocco di testo (--psm 6);
+    # i frame senza regioni non arrivano a Tesseract
+    crops = []
+    for img in images:
+        if isinstance(img, Path):
+            with Image.open(img) as im:
+                crops.append(region_image(im, regions))
+        else:
+            crops.append(region_image(img, regions))
+    found = [crop for crop in crops if crop is not None]
+    results = iter(recognize(found, lang, ROI_PSM) if found else [])
+    return [next(results) if crop is not None else ("", None) for crop in crops]
+
+def resolve_ocr_backend(backend):
+    if backend == "tesserocr" and tesserocr is None:
+        print("⚠️ tesserocr non installato, uso il backend subprocess")
+        return "subprocess"
+    return backend
+
+def print_worker_stats(stats, elapsed):
+    total = sum(count for count, _ in stats.values())
+    print(f"📊 {total} frame in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.2f} frame/s totali)")
+    for name, (count, busy) in sorted(stats.items()):
+        print(f"   {name}: {count} frame, {count / busy if busy else 0:.2f} frame/s")
+
+def run_ocr(lang, workers=1, images=None, backend="subprocess", regions=None, text_threshold=None):
+    backend = resolve_ocr_backend(backend)
+    print(f"🔍 OCR in corso ({workers} worker, backend: {backend})...")
+    if images is None:
+        images = sorted(DIRS["images"].glob("*.png"), key=frame_order)
+    recognize = OCR_BACKENDS[backend]
+    version = tesseract_version()
+    # Le regioni entrano nella chiave solo se usate: l'OCR a frame intero già in cache resta valido
+    keys = {img: STAGES.key(STAGES.file_digest(img), lang, backend, version, *([regions] if regions else [])) for img in images}
+    pending = [img for img in images
+               if STAGES.get("ocr", keys[img]) is None or not (DIRS["ocr_output"] / img.name.replace(".png", ".txt")).exists()]
+    if len(pending) < len(images):
+        print(f"⏭️ {len(images) - len(pending)} frame già elaborati, OCR su {len(pending)}")
+    images = pending
+    size = max(1, min(OCR_BATCH_SIZE, -(-len(images) // max(1, workers)))) if backend in ("batch", "montage") else 1
+    chunks = [images[i:i + size] for i in range(0, len(images), size)]
+    stats = {}
+    lock = threading.Lock()
+
+    skipped = []
+
+    def task(chunk):
+        start = time.perf_counter()
+        # Prefiltro: i frame con punteggio sotto soglia non arrivano a Tesseract e non entrano nella cache,
+        # così abbassando la soglia vengono letti alla prossima esecuzione
+        scores = {img: load_text_score(img) for img in chunk} if text_threshold is not None else {}
+        todo = [img for img in chunk if img not in scores or scores[img] >= text_threshold]
+        results = {}
+        if todo:
+            with CPU_BUDGET:
+                results = dict(zip(todo, ocr_regions(recognize, todo, lang, regions) if regions else recognize(todo, lang)))
+        for img in chunk:
+            if img not in results:
+                LEDGER.write_text(DIRS["ocr_output"] / img.name.replace(".png", ".txt"), "")
+                INDEX.put_ocr(img.stem, None, None, scores[img])
+                skipped.append(img)
+                continue
+            text, confidence = results[img]
+            LEDGER.write_text(DIRS["ocr_output"] / img.name.replace(".png", ".txt"), text)
+            INDEX.put_ocr(img.stem, text, confidence, scores.get(img))
+            STAGES.put("ocr", keys[img])
+        busy = time.perf_counter() - start
+        with lock:
+            count, total = stats.get(threading.current_thread().name, (0, 0.0))
+            stats[threading.current_thread().name] = (count + len(chunk), total + busy)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ocr") as pool:
+        list(pool.map(task, chunks))
     print("✅ OCR completato")
-    calculate_hashes(list(DIRS["ocr_output"].glob("*.txt")), WORKING_DIR / f"hash-ocr-{timestamp}.csv")
+    print_worker_stats(stats, time.perf_counter() - start)
+    if skipped:
+        print(f"🚫 {len(skipped)} frame senza testo (punteggio < {text_threshold}), OCR saltato")
 
-def translate_texts(dest_lang, timestamp):
-    print("🌐 Traduzione testi OCR...")
+def probe_video_size(video):
+    # None: file senza stream video (solo audio, corrotto, non multimediale)
+    output = subprocess.run(["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=width,height", "-of", "csv=p=0:s=x", str(video)],
+                            capture_output=True, text=True)
+    lines = output.stdout.strip().splitlines()
+    if output.returncode != 0 or not lines:
+        return None
+    width, height = lines[0].split("x")[:2]
+    return int(width), int(height)
+
+def stream_ocr(lang, framerate, mode="fixed", scene_threshold=0.3, min_interval=0.5, max_interval=10.0,
+               workers=1, backend="subprocess", dedup_threshold=None, videos=None, regions=None, text_threshold=None):
+    backend = resolve_ocr_backend(backend)
+    if backend == "batch":
+        print("⚠️ Il backend batch legge i frame da disco, in streaming uso subprocess")
+        backend = "subprocess"
+    print(f"🎞️ Estrazione e OCR in streaming ({workers} worker, backend: {backend})...")
+    recognize = OCR_BACKENDS[backend]
+    # Al massimo 2 frame in attesa per worker: la memoria resta limitata qualunque sia la durata del video
+    slots = threading.BoundedSemaphore(max(1, workers) * 2)
+    stats = {}
+    lock = threading.Lock()
+    groups, dedup_rows, video_times, video_keys, futures = {}, [], {}, {}, {}
+    version = tesseract_version()
+
+    def task(name, image, persist):
+        try:
+            start = time.perf_counter()
+            score = text_score(image) if text_threshold is not None else None
+            text, confidence = "", None
+            if score is None or score >= text_threshold:
+                with CPU_BUDGET:
+                    text, confidence = (ocr_regions(recognize, [image], lang, regions) if regions else recognize([image], lang))[0]
+            # Su disco finiscono solo i frame con testo (o i rappresentativi della deduplicazione)
+            if persist or text.strip():
+                buffer = io.BytesIO()
+                image.save(buffer, format="PNG", compress_level=1)
+                LEDGER.write_bytes(DIRS["images"] / f"{name}.png", buffer.getvalue())
+                LEDGER.write_text(DIRS["ocr_output"] / f"{name}.txt", text)
+            skip = score is not None and score < text_threshold
+            INDEX.put_ocr(name, None if skip else text, None if skip else confidence, score)
+            busy = time.perf_counter() - start
+            with lock:
+                count, total = stats.get(threading.current_thread().name, (0, 0.0))
+                stats[threading.current_thread().name] = (count + 1, total + busy)
+        finally:
+            slots.release()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ocr") as pool:
+        for video in DIRS["video"].glob("*") if videos is None else videos:
+            key = STAGES.key(video.stem, STAGES.file_digest(video), framerate, mode, scene_threshold, min_interval, max_interval,
+                             lang, backend, version, dedup_threshold, *([regions] if regions else []),
+                             *([text_threshold] if text_threshold is not None else []))
+            done = STAGES.get("stream", key)
+            if done is not None and all((WORKING_DIR / name).exists() for name in done["files"]):
+                print(f"⏭️ {video.name}: già elaborato")
+                groups.update(done["groups"])
+                dedup_rows.extend(done["dedup_rows"])
+                continue
+            size = probe_video_size(video)
+            if size is None:
+                print(f"⚠️ ffmpeg ha fallito su {video.name}: nessuno stream video")
+                continue
+            width, height = size
+            video_keys[video] = key
+            clear_frames(video)
+            input_args, output_args = ffmpeg_frame_args(framerate, mode, scene_threshold, min_interval, max_interval)
+            cmd = ["ffmpeg", "-nostdin", "-noautorotate", *input_args, "-i", str(video), *output_args, "-f", "rawvideo", "-pix_fmt", "rgb24", "-"]
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            stderr = []
+            reader = threading.Thread(target=lambda: stderr.append(proc.stderr.read().decode("utf-8", "replace")))
+            reader.start()
+            frame_size = width * height * 3
+            n = 0
+            rep = rep_hash = None
+            while True:
+                data = proc.stdout.read(frame_size)
+                if len(data) < frame_size:
+                    break
+                n += 1
+                name = f"{video.stem}-{n:04d}"
+                image = Image.frombytes("RGB", (width, height), data)
+                if dedup_threshold is not None:
+                    h = int(dhash_pixels(thumbnail_pixels(image, (9, 8))[None])[0])
+                    distance = bin(h ^ rep_hash).count("1") if rep is not None else None
+                    if distance is None or distance > dedup_threshold:
+                        rep, rep_hash, distance = name, h, 0
+                    groups[f"{name}.png"] = f"{rep}.png"
+                    dedup_rows.append([f"02.images/{name}.png", f"02.images/{rep}.png", distance, f"{h:016x}"])
+                    if rep != name:
+                        continue
+                slots.acquire()
+                futures[pool.submit(task, name, image, dedup_threshold is not None)] = (video, name)
+            proc.stdout.close()
+            proc.wait()
+            reader.join()
+            if proc.returncode != 0:
+                print(f"⚠️ ffmpeg ha fallito su {video.name}: {stderr[0].strip().splitlines()[-1:]}")
+                del video_keys[video]
+            video_times[video] = [k / framerate for k in range(n)] if mode == "fixed" else parse_showinfo_times(stderr[0])
+    # Un frame fallito lascia il video incompleto: niente cache, alla prossima esecuzione viene rielaborato
+    for future, (video, name) in futures.items():
+        if future.exception() is not None:
+            print(f"❌ OCR fallito su {name}: {future.exception()}")
+            video_keys.pop(video, None)
+    for video, times in video_times.items():
+        write_frame_timestamps(video, times)
+    # Un video è completo solo quando tutti i suoi frame sono stati riconosciuti
+    for video, key in video_keys.items():
+        files = [img.relative_to(WORKING_DIR).as_posix() for img in video_frames(video.stem)]
+        files += [f"04.ocr_output/{img.stem}.txt" for img in video_frames(video.stem)]
+        STAGES.put("stream", key, {"files": files,
+                                   "groups": {name: rep for name, rep in groups.items() if frame_video(Path(name)) == video.stem},
+                                   "dedup_rows": [row for row in dedup_rows if frame_video(Path(row[0])) == video.stem]})
+    print("✅ Estrazione e OCR completati")
+    print_worker_stats(stats, time.perf_counter() - start)
+    return groups, dedup_rows
+
+class TranslationCache:
+    # Cache persistente delle traduzioni: chiave = SHA-256 di (lingua sorgente, lingua destinazione, testo normalizzato)
+    def __init__(self, path, max_entries=100000):
+        self.db = sqlite3.connect(str(path), check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS translations (key TEXT PRIMARY KEY, src TEXT, dest TEXT, text TEXT, translated TEXT, last_used REAL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)")
+        self.lock = threading.Lock()
+        self.max_entries = max_entries
+        self.hits = self.misses = self.pending = 0
+
+    @staticmethod
+    def key(text, src, dest):
+        return hashlib.sha256(f"{src}\0{dest}\0{' '.join(text.split())}".encode("utf-8")).hexdigest()
+
+    def get(self, text, src, dest):
+        key = self.key(text, src, dest)
+        with self.lock:
+            row = self.db.execute("SELECT translated FROM translations WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute("UPDATE translations SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, text, src, dest, translated):
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?, ?)",
+                            (self.key(text, src, dest), src, dest, text, translated, time.time()))
+            self.pending += 1
+            if self.pending >= 100:
+                self.db.commit()
+                self.pending = 0
+
+    def close(self):
+        with self.lock:
+            # Evizione LRU: restano solo le max_entries voci usate più di recente
+            self.db.execute("DELETE FROM translations WHERE key IN (SELECT key FROM translations ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                            (self.max_entries,))
+            self.db.commit()
+            self.db.close()
+        total = self.hits + self.misses
+        print(f"🗃️ Cache traduzioni: {self.hits} hit, {self.misses} miss ({100 * self.hits / total if total else 0:.1f}% hit)")
+
+# Separatore tra i testi di un blocco: un simbolo che i traduttori lasciano invariato
+BATCH_SEPARATOR = "\n⁂\n"
+
+def normalize_text(text):
+    return " ".join(text.split())
+
+def google_translator(url=None, pairs=()):
+    if Translator is None:
+        print("\n❌ googletrans non è installato: usa --translator libretranslate, argos o marian")
+        sys.exit(1)
     translator = Translator()
-    for file in DIRS["ocr_output"].glob("*.txt"):
-        text = file.read_text(encoding='utf-8')
-        translated = translator.translate(text, dest=dest_lang).text
-        output_file = DIRS["translated_output"] / file.name.replace(".txt", f"_{dest_lang}.txt")
-        output_file.write_text(translated, encoding='utf-8')
-    calculate_hashes(list(DIRS["translated_output"].glob("*.txt")), WORKING_DIR / f"hash-translated-{timestamp}.csv")
-
-def process_audio_whisper(timestamp, mode="offline", model_size="base"):
-    print(f"🎧 Trascrizione audio (Whisper: {model_size}, mode: {mode})...")
+
+    def translate_batch(texts, src_lang, dest_lang):
+        # None: separatori alterati, TranslationService ritraduce il blocco testo per testo
+        if len(texts) > 1:
+            joined = translator.translate(BATCH_SEPARATOR.join(texts), src=src_lang, dest=dest_lang).text
+            parts = re.split(r"\s*⁂\s*", joined)
+            if len(parts) == len(texts):
+                return parts
+            print(f"⚠️ Separatori alterati dal traduttore ({len(parts)}/{len(texts)}), traduco il blocco testo per testo")
+            return None
+        return [translator.translate(texts[0], src=src_lang, dest=dest_lang).text]
+    return translate_batch
+
+def libretranslate_translator(url, pairs=()):
+    # API compatibile LibreTranslate: un'unica richiesta POST /translate con l'elenco dei testi
+    def translate_batch(texts, src_lang, dest_lang):
+        payload = json.dumps({"q": texts, "source": src_lang, "target": dest_lang, "format": "text"}).encode("utf-8")
+        request = urllib.request.Request(url.rstrip("/") + "/translate", data=payload, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=120) as response:
+            translated = json.load(response)["translatedText"]
+        return translated if isinstance(translated, list) else [translated]
+    return translate_batch
+
+def preload_models(load, pairs, hint):
+    # Le coppie note all'avvio vengono caricate subito: un modello mancante ferma lo script prima di tradurre
+    for src_lang, dest_lang in pairs:
+        if src_lang != dest_lang:
+            try:
+                load(src_lang, dest_lang)
+            except LookupError as e:
+                print(f"\n❌ {e}: {hint.format(src=src_lang, dest=dest_lang)}")
+                sys.exit(1)
+
+def argos_translator(url=None, pairs=()):
+    # Traduzione offline con Argos Translate (CTranslate2): un modello per coppia di lingue, caricato una volta
+    import argostranslate.translate
+    models = {}
+    lock = threading.Lock()
+
+    def load(src_lang, dest_lang):
+        with lock:
+            if (src_lang, dest_lang) not in models:
+                try:
+                    models[(src_lang, dest_lang)] = argostranslate.translate.get_translation_from_codes(src_lang, dest_lang)
+                except Exception:
+                    models[(src_lang, dest_lang)] = None
+            if models[(src_lang, dest_lang)] is None:
+                raise LookupError(f"modello Argos {src_lang}→{dest_lang} non installato")
+            return models[(src_lang, dest_lang)]
+
+    def translate_batch(texts, src_lang, dest_lang):
+        if src_lang == dest_lang:
+            return list(texts)
+        model = load(src_lang, dest_lang)
+        return [model.translate(text) for text in texts]
+    preload_models(load, pairs, "argospm install translate-{src}_{dest}")
+    return translate_batch
+
+def split_for_model(tokenizer, text, limit):
+    # Testo oltre il limite di token del modello: diviso per frasi, e le frasi troppo lunghe per parole
+    sentences = [sentence for sentence in re.split(r"(?<=[.!?])\s+|\n+", text) if sentence.strip()]
+    units = []
+    for sentence, ids in zip(sentences, tokenizer(sentences, add_special_tokens=False).input_ids):
+        if len(ids) < limit:
+            units.append((sentence, len(ids)))
+        else:
+            words = sentence.split()
+            units.extend(zip(words, map(len, tokenizer(words, add_special_tokens=False).input_ids)))
+    pieces, current, size = [], [], 0
+    for unit, length in units:
+        if current and size + length >= limit:
+            pieces.append(" ".join(current))
+            current, size = [], 0
+        current.append(unit)
+        size += length
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+def marian_translator(url=None, pairs=()):
+    # Traduzione offline con MarianMT (Helsinki-NLP/opus-mt-*): ogni blocco è un'unica inferenza batch su CPU.
+    # Niente troncamento: i testi oltre il limite del modello vengono tradotti a pezzi e ricomposti
+    import torch
+    from transformers import MarianMTModel, MarianTokenizer
+    models = {}
+    lock = threading.Lock()
+
+    def load(src_lang, dest_lang):
+        name = f"Helsinki-NLP/opus-mt-{src_lang}-{dest_lang}"
+        with lock:
+            if (src_lang, dest_lang) not in models:
+                try:
+                    models[(src_lang, dest_lang)] = (MarianTokenizer.from_pretrained(name), MarianMTModel.from_pretrained(name).eval())
+                except OSError:
+                    models[(src_lang, dest_lang)] = None
+            if models[(src_lang, dest_lang)] is None:
+                raise LookupError(f"modello Marian {name} non disponibile")
+            return models[(src_lang, dest_lang)]
+
+    def translate_batch(texts, src_lang, dest_lang):
+        if src_lang == dest_lang:
+            return list(texts)
+        tokenizer, model = load(src_lang, dest_lang)
+        # Un token resta per il terminatore </s>
+        limit = tokenizer.model_max_length - 1
+        pieces, owners = [], []
+        for i, (text, ids) in enumerate(zip(texts, tokenizer(texts).input_ids)):
+            parts = [text] if len(ids) <= limit + 1 else split_for_model(tokenizer, text, limit)
+            if len(parts) > 1:
+                print(f"✂️ Testo di {len(ids)} token oltre il limite di Marian, tradotto in {len(parts)} parti")
+            pieces.extend(parts)
+            owners.extend([i] * len(parts))
+        with torch.no_grad():
+            outputs = model.generate(**tokenizer(pieces, return_tensors="pt", padding=True))
+        translated = [[] for _ in texts]
+        for i, text in zip(owners, tokenizer.batch_decode(outputs, skip_special_tokens=True)):
+            translated[i].append(text)
+        return [" ".join(parts) for parts in translated]
+    preload_models(load, pairs, "modello da scaricare con rete (Hugging Face) o da copiare nella cache locale")
+    return translate_batch
+
+TRANSLATORS = {"google": google_translator, "libretranslate": libretranslate_translator, "argos": argos_translator, "marian": marian_translator}
+OFFLINE_TRANSLATORS = {"argos", "marian"}
+
+# Codici Tesseract -> ISO 639-1, per i traduttori offline che non rilevano la lingua sorgente
+TESSERACT_LANGUAGES = {
+    "eng": "en", "ita": "it", "fra": "fr", "deu": "de", "spa": "es", "por": "pt", "nld": "nl", "pol": "pl",
+    "rus": "ru", "ukr": "uk", "ara": "ar", "fas": "fa", "heb": "he", "tur": "tr", "hin": "hi",
+    "chi_sim": "zh", "chi_tra": "zt", "jpn": "ja", "kor": "ko",
+}
+
+def make_translator(name, url=None, pairs=()):
+    return TRANSLATORS[name](url, pairs)
+
+def source_language(args):
+    if args.source_language:
+        return args.source_language
+    if args.translator in OFFLINE_TRANSLATORS:
+        return TESSERACT_LANGUAGES.get(args.lang.split("+")[0], "en")
+    return "auto"
+
+def pack_batches(texts, char_budget):
+    batches, current, size = [], [], 0
+    for text in texts:
+        if current and size + len(text) > char_budget:
+            batches.append(current)
+            current, size = [], 0
+        current.append(text)
+        size += len(text) + len(BATCH_SEPARATOR)
+    if current:
+        batches.append(current)
+    return batches
+
+class TokenBucket:
+    # Limita le richieste a `rate` al secondo, con raffiche fino a `burst` richieste
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    async def acquire(self):
+        # Condiviso tra i video elaborati in parallelo, ognuno con il proprio event loop
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            await asyncio.sleep(wait)
+
+class TranslationService:
+    # Testi identici (a meno di spazi) vengono tradotti una sola volta, i nuovi in blocchi da char_budget caratteri
+    # inviati in parallelo (concurrency), con limite di frequenza (rate) e nuovi tentativi con backoff esponenziale.
+    # I testi non tradotti finiscono in failure_log e, non essendo in cache, vengono ritentati all'esecuzione successiva.
+    def __init__(self, cache, translate_batch, char_budget=4000, concurrency=4, rate=5.0, retries=5, failure_log=None, source_lang="auto"):
+        self.cache = cache
+        self.source_lang = source_lang
+        self.translate_batch = translate_batch
+        self.char_budget = char_budget
+        self.rate = rate
+        self.retries = retries
+        self.failure_log = failure_log
+        self.failures = []
+        self.bucket = TokenBucket(rate) if rate > 0 else None
+        # Condiviso tra i video e l'audio, ognuno con il proprio event loop: la concorrenza vale per l'intera esecuzione
+        self.slots = threading.BoundedSemaphore(max(1, concurrency))
+        if failure_log and failure_log.exists():
+            previous = len(failure_log.read_text(encoding="utf-8").splitlines())
+            if previous:
+                print(f"🔁 {previous} testi non tradotti nell'esecuzione precedente verranno ritentati")
+
+    async def _acquire_slot(self):
+        while not self.slots.acquire(blocking=False):
+            await asyncio.sleep(0.05)
+
+    def _fail(self, batch, src_lang, dest_lang, error):
+        self.failures.extend({"src": src_lang, "dest": dest_lang, "text": text, "error": error} for text in batch)
+        return [None] * len(batch)
+
+    async def _translate_batches(self, batches, src_lang, dest_lang):
+        async def run(batch):
+            await self._acquire_slot()
+            try:
+                for attempt in range(self.retries + 1):
+                    if self.bucket:
+                        await self.bucket.acquire()
+                    try:
+                        translated = await asyncio.to_thread(self.translate_batch, batch, src_lang, dest_lang)
+                    except Exception as e:
+                        # Modello mancante (LookupError): ritentare non serve
+                        if attempt == self.retries or isinstance(e, LookupError):
+                            print(f"❌ Traduzione fallita dopo {attempt + 1} tentativi: {e}")
+                            return self._fail(batch, src_lang, dest_lang, str(e))
+                        delay = min(60, 2 ** attempt) * random.uniform(0.5, 1.0)
+                        print(f"⚠️ Errore di traduzione ({e}), nuovo tentativo tra {delay:.1f}s")
+                        await asyncio.sleep(delay)
+                        continue
+                    if translated is None and len(batch) > 1:
+                        break
+                    if translated is None or len(translated) != len(batch):
+                        error = f"{0 if translated is None else len(translated)} traduzioni ricevute per {len(batch)} testi"
+                        print(f"❌ Traduzione fallita: {error}")
+                        return self._fail(batch, src_lang, dest_lang, error)
+                    for text, result in zip(batch, translated):
+                        self.cache.put(text, src_lang, dest_lang, result)
+                    return translated
+            finally:
+                self.slots.release()
+            # Blocco che il traduttore non sa separare: un testo per richiesta, ognuna con il proprio token
+            return [result for part in await asyncio.gather(*(run([text]) for text in batch)) for result in part]
+
+        return await asyncio.gather(*(run(batch) for batch in batches))
+
+    def translate(self, texts, dest_lang, src_lang=None):
+        src_lang = src_lang or self.source_lang
+        translations, pending = {}, []
+        for text in texts:
+            key = normalize_text(text)
+            if not key or key in translations:
+                continue
+            translations[key] = self.cache.get(text, src_lang, dest_lang)
+            if translations[key] is None:
+                pending.append(text)
+        batches = pack_batches(pending, self.char_budget)
+        if batches:
+            print(f"📨 {len(pending)} testi da tradurre in {len(batches)} richieste")
+            for batch, translated in zip(batches, asyncio.run(self._translate_batches(batches, src_lang, dest_lang))):
+                for text, result in zip(batch, translated):
+                    translations[normalize_text(text)] = result
+        # Testo vuoto: nessuna traduzione necessaria; None: traduzione fallita
+        return [translations[normalize_text(text)] if normalize_text(text) else text for text in texts]
+
+    def close(self):
+        self.cache.close()
+        if self.failure_log:
+            LEDGER.write_text(self.failure_log, "".join(json.dumps(failure, ensure_ascii=False) + "\n" for failure in self.failures))
+        if self.failures:
+            print(f"⚠️ {len(self.failures)} testi non tradotti, elencati in {self.failure_log}")
+
+def translate_texts(dest_lang, translation, translator="", files=None):
+    print("🌐 Traduzione testi OCR...")
+    files = sorted(DIRS["ocr_output"].glob("*.txt")) if files is None else [file for file in files if file.exists()]
+    keys = {file: STAGES.key(STAGES.file_digest(file), dest_lang, translator, translation.source_lang) for file in files}
+    files = [file for file in files if STAGES.get("translate", keys[file]) is None
+             or not (DIRS["translated_output"] / file.name.replace(".txt", f"_{dest_lang}.txt")).exists()]
+    texts = [file.read_text(encoding='utf-8') for file in files]
+    for file, translated in zip(files, translation.translate(texts, dest_lang)):
+        if translated is not None:
+            output_file = DIRS["translated_output"] / file.name.replace(".txt", f"_{dest_lang}.txt")
+            LEDGER.write_text(output_file, translated)
+            INDEX.put_translation(file.stem, dest_lang, translated)
+            STAGES.put("translate", keys[file])
+
+def window_energy(samples, hop):
+    frames = len(samples) // hop
+    return np.sqrt(np.mean(samples[:frames * hop].reshape(frames, hop) ** 2, axis=1))
+
+def audio_chunks(stream, target=60.0, search=5.0, silence=0.01, window=0.03, wav=None):
+    # Legge il PCM dalla pipe di ffmpeg e taglia nel punto di minima energia entro ±search secondi da ogni target:
+    # nessuna parola spezzata a metà e in memoria solo il blocco corrente. I blocchi interamente sotto la soglia
+    # di silenzio (RMS) vengono scartati, Whisper vi produrrebbe solo allucinazioni
+    # Blocchi brevi (target <= search): la ricerca si restringe a metà blocco, altrimenti il taglio potrebbe
+    # cadere a 0 e il buffer non si svuoterebbe mai
+    search = min(search, target / 2)
+    hop = int(AUDIO_RATE * window)
+    limit = int((target + search) * AUDIO_RATE)
+    buffer, offset = np.zeros(0, dtype=np.float32), 0
+    while True:
+        data = stream.read((limit - len(buffer)) * 2)
+        if wav is not None:
+            wav.writeframes(data)
+        buffer = np.concatenate([buffer, np.frombuffer(data[:len(data) // 2 * 2], dtype="<i2").astype(np.float32) / 32768])
+        end = len(buffer) < limit
+        if end:
+            cut = len(buffer)
+        else:
+            low = max(1, int((target - search) * AUDIO_RATE) // hop)
+            cut = (low + int(np.argmin(window_energy(buffer, hop)[low:]))) * hop
+        chunk, buffer = buffer[:cut], buffer[cut:]
+        if len(chunk) >= hop and window_energy(chunk, hop).max() >= silence:
+            yield offset, chunk
+        offset += cut
+        if end:
+            return
+
+def ensure_whisper(backend):
+    # Verificato all'avvio: un modulo mancante emergerebbe solo dentro il worker, come pool di processi rotto.
+    # openai-whisper (e con lui PyTorch) viene installato solo per il backend openai: faster non ne ha bisogno
+    if backend == "faster" and importlib.util.find_spec("faster_whisper") is None:
+        print("\n❌ faster-whisper non è installato: pip install faster-whisper, oppure usa --whisper-backend openai")
+        sys.exit(1)
+    if backend == "openai" and importlib.util.find_spec("whisper") is None:
+        subprocess.check_call([sys.executable, "-m", "pip", "install", "openai-whisper"])
+
+def init_whisper_worker(backend, model_size, threads):
+    # Eseguito una volta per processo: il modello resta in memoria per tutti i blocchi assegnati al worker.
+    # faster: faster-whisper (CTranslate2) quantizzato int8, molto più rapido su CPU senza GPU
+    global WHISPER_MODEL, WHISPER_BACKEND
+    WHISPER_BACKEND = backend
+    if backend == "faster":
+        from faster_whisper import WhisperModel
+        WHISPER_MODEL = WhisperModel(model_size, device="cpu", compute_type="int8", cpu_threads=threads)
+        return
+    import torch
+    import whisper
+    torch.set_num_threads(threads)
+    WHISPER_MODEL = whisper.load_model(model_size)
+
+def transcribe_chunk(samples, offset):
+    if WHISPER_BACKEND == "faster":
+        segments, info = WHISPER_MODEL.transcribe(samples)
+        segments = [{"start": segment.start, "end": segment.end, "text": segment.text} for segment in segments]
+        language = info.language
+    else:
+        result = WHISPER_MODEL.transcribe(samples, fp16=False)
+        segments, language = result.get("segments", []), result.get("language")
+    segments = [{"start": round(segment["start"] + offset, 3), "end": round(segment["end"] + offset, 3), "text": segment["text"].strip()}
+                for segment in segments]
+    return " ".join(segment["text"] for segment in segments if segment["text"]), language, segments
+
+def peak_memory_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss è in KiB su Linux, in byte su macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def benchmark_worker(backend, model_size, threads, samples):
+    # Eseguito in un processo avviato da zero (spawn) per ogni combinazione: nessuna libreria ereditata dal padre,
+    # e la memoria è il picco meno la RSS prima del caricamento, cioè quella del solo modello in prova
+    baseline = peak_memory_mb()
+    start = time.perf_counter()
+    init_whisper_worker(backend, model_size, threads)
+    loaded = time.perf_counter()
+    transcribe_chunk(samples, 0)
+    peak = peak_memory_mb()
+    return loaded - start, time.perf_counter() - loaded, None if peak is None else peak - baseline
+
+def benchmark_whisper(timestamp, models, seconds=120.0, threads=None):
+    # RTF (real-time factor) = tempo di trascrizione / durata dell'audio: sotto 1 la trascrizione è più veloce del tempo reale
+    videos = sorted(DIRS["video"].glob("*"))
+    if not videos:
+        print("❌ Nessun video in 01.video per il benchmark Whisper")
+        return None
+    cmd = ["ffmpeg", "-nostdin", "-v", "error", "-t", str(seconds), "-i", str(videos[0]), "-vn", "-f", "s16le", "-ac", "1", "-ar", str(AUDIO_RATE), "-"]
+    pcm = subprocess.run(cmd, capture_output=True).stdout
+    samples = np.frombuffer(pcm[:len(pcm) // 2 * 2], dtype="<i2").astype(np.float32) / 32768
+    duration = len(samples) / AUDIO_RATE
+    if not duration:
+        print(f"❌ Nessun audio decodificabile in {videos[0].name}")
+        return None
+    backends = [backend for backend, module in (("openai", "whisper"), ("faster", "faster_whisper")) if importlib.util.find_spec(module)]
+    if not backends:
+        ensure_whisper("openai")
+        backends = ["openai"]
+    threads = threads or os.cpu_count() or 1
+    print(f"⏱️ Benchmark Whisper su {duration:.1f}s di {videos[0].name} ({', '.join(backends)}; {threads} thread)...")
+    rows = []
+    for model_size in models:
+        for backend in backends:
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                try:
+                    load, elapsed, memory = pool.submit(benchmark_worker, backend, model_size, threads, samples).result()
+                except Exception as e:
+                    print(f"   ⚠️ {backend}/{model_size}: {e}")
+                    continue
+            rows.append([backend, model_size, f"{duration:.1f}", f"{load:.1f}", f"{elapsed:.1f}", f"{elapsed / duration:.3f}",
+                         "" if memory is None else f"{memory:.0f}"])
+            print(f"   {backend}/{model_size}: RTF {elapsed / duration:.3f}, caricamento {load:.1f}s"
+                  + ("" if memory is None else f", memoria del modello {memory:.0f} MB"))
+    output_csv = WORKING_DIR / f"whisper-benchmark-{timestamp}.csv"
+    with io.StringIO() as f:
+        writer = csv.writer(f)
+        writer.writerow(["Backend", "Model", "Audio (s)", "Load (s)", "Transcription (s)", "RTF", "Model peak RSS (MB)"])
+        writer.writerows(rows)
+        LEDGER.write_text(output_csv, f.getvalue())
+    print(f"✅ Benchmark salvato in {output_csv}")
+    return output_csv
+
+def release_cpu(slots):
+    for _ in range(slots):
+        CPU_BUDGET.release()
+
+def transcribe_chunked(pool, chunks, threads=1):
+    # Ogni blocco in corso occupa in CPU_BUDGET tanti slot quanti i thread del worker che lo trascrive;
+    # i risultati vengono ricuciti in ordine con i tempi assoluti
+    futures = []
+    for offset, samples in chunks:
+        for _ in range(threads):
+            CPU_BUDGET.acquire()
+        try:
+            future = pool.submit(transcribe_chunk, samples, offset / AUDIO_RATE)
+        except BaseException:
+            # Pool rotto (es. modello non caricabile nel worker): gli slot tornano ai thread dei video
+            release_cpu(threads)
+            raise
+        future.add_done_callback(lambda _: release_cpu(threads))
+        futures.append((len(samples), future))
+    texts, languages, segments = [], Counter(), []
+    for length, future in futures:
+        text, language, chunk_segments = future.result()
+        if text:
+            texts.append(text)
+        languages[language] += length
+        segments.extend(chunk_segments)
+    return {"text": " ".join(texts), "language": languages.most_common(1)[0][0] if languages else None, "segments": segments}
+
+def transcribe_video(pool, video, chunk_seconds, wav_path=None, threads=1):
+    # ffmpeg decodifica direttamente in memoria (PCM 16 bit mono 16 kHz): nessun file intermedio e nessuna doppia
+    # decodifica. Con wav_path lo stesso flusso viene salvato anche su disco per la catena di custodia
+    cmd = ["ffmpeg", "-nostdin", "-v", "error", "-i", str(video), "-vn", "-f", "s16le", "-ac", "1", "-ar", str(AUDIO_RATE), "-"]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    wav = None
+    if wav_path:
+        wav = wave.open(str(wav_path), "wb")
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(AUDIO_RATE)
+    try:
+        result = transcribe_chunked(pool, audio_chunks(proc.stdout, chunk_seconds, wav=wav), threads)
+    finally:
+        if wav is not None:
+            wav.close()
+        proc.stdout.close()
+        proc.wait()
+    # Video senza traccia audio o decodifica fallita: il risultato non va in cache
+    if proc.returncode != 0:
+        print(f"⚠️ Audio di {video.name} non decodificato da ffmpeg")
+        return None
+    return result
+
+AUDIO_LANGUAGES = {"en": "Inglese", "it": "Italiano"}
+
+def write_transcript(base, segments, texts):
+    # Segmenti (Whisper o cue dei sottotitoli) con i loro tempi in tre formati: testo semplice, SRT e WebVTT
+    cues = [(format_timestamp(segment["start"]), format_timestamp(segment["end"]), text) for segment, text in zip(segments, texts) if text]
+    LEDGER.write_text(Path(f"{base}.txt"), " ".join(text for text in texts if text))
+    LEDGER.write_text(Path(f"{base}.srt"), "".join(f"{i}\n{start.replace('.', ',')} --> {end.replace('.', ',')}\n{text}\n\n"
+                                                  for i, (start, end, text) in enumerate(cues, 1)))
+    LEDGER.write_text(Path(f"{base}.vtt"), "WEBVTT\n\n" + "".join(f"{start} --> {end}\n{text}\n\n" for start, end, text in cues))
+
+def process_audio_whisper(translation, mode="offline", model_size="base", workers=1, chunk_seconds=60.0, keep_wav=False, backend="openai"):
+    # Un insieme di file per video in 06.audio: <video>.txt/.srt/.vtt, <video>.json con i segmenti e le traduzioni,
+    # <video>_<lingua>.txt/.srt/.vtt tradotti segmento per segmento (en; en e it in modalità online)
+    print(f"🎧 Trascrizione audio (Whisper: {model_size}, backend: {backend}, mode: {mode})...")
     audio_dir = WORKING_DIR / "06.audio"
     audio_dir.mkdir(parents=True, exist_ok=True)
+    dest_langs = ["en", "it"] if mode == "online" else ["en"]
+    transcripts = []
+    pool = None
+    # I worker si dividono CPU_BUDGET: workers × threads non supera mai il budget
+    threads = max(1, CPU_SLOTS // max(1, workers))
 
-    audio_txt = audio_dir / f"transcript_{timestamp}.txt"
-    audio_translated_en = audio_dir / f"transcript_{timestamp}_en.txt"
-    audio_translated_it = audio_dir / f"transcript_{timestamp}_it.txt"
+    for video in sorted(DIRS["video"].glob("*")):
+        # Un video che fallisce viene segnalato e saltato: l'audio non interrompe mai l'OCR
+        try:
+            key = STAGES.key(STAGES.file_digest(video), backend, model_size, chunk_seconds)
+            result = STAGES.get("whisper", key)
+            wav_path = audio_dir / f"{video.stem}.wav" if keep_wav else None
+            if result is None or (wav_path and not wav_path.exists()):
+                if pool is None:
+                    # spawn: il thread audio gira accanto ai thread dei video, un fork di un processo multi-thread
+                    # può ereditare lock presi da altri thread
+                    pool = ProcessPoolExecutor(max_workers=max(1, workers), mp_context=multiprocessing.get_context("spawn"),
+                                               initializer=init_whisper_worker, initargs=(backend, model_size, threads))
+                result = transcribe_video(pool, video, chunk_seconds, wav_path, threads)
+                if result is None:
+                    result = {"text": "", "language": None, "segments": []}
+                else:
+                    STAGES.put("whisper", key, result)
+            else:
+                print(f"⏭️ {video.name}: trascrizione già disponibile")
+            segments = result["segments"]
+            base = audio_dir / video.stem
+            write_transcript(base, segments, [segment["text"] for segment in segments])
+            files = {"txt": Path(f"{base}.txt")}
+            for dest_lang in dest_langs:
+                translated = translation.translate([segment["text"] for segment in segments], dest_lang, result.get("language"))
+                if None in translated:
+                    print(f"⚠️ {video.name}: traduzione {dest_lang} incompleta, file non generati")
+                    continue
+                for segment, text in zip(segments, translated):
+                    segment[dest_lang] = text
+                write_transcript(Path(f"{base}_{dest_lang}"), segments, translated)
+                files[dest_lang] = Path(f"{base}_{dest_lang}.txt")
+            INDEX.put_segments(video.stem, segments, result.get("language"))
+            LEDGER.write_text(Path(f"{base}.json"), json.dumps({"video": video.name, "backend": backend, "model": model_size,
+                                                                "language": result.get("language"), "segments": segments},
+                                                               ensure_ascii=False, indent=2))
+            transcripts.append((video, files))
+        except Exception as e:
+            print(f"❌ {video.name}: trascrizione audio fallita: {e}")
+            if isinstance(e, BrokenProcessPool):
+                pool.shutdown()
+                pool = None
 
-    model = whisper.load_model(model_size)
-    translator = Translator()
+    if pool is not None:
+        pool.shutdown()
+    return transcripts
+
+def make_thumbnail(img):
+    thumb = DIRS["thumbnails"] / f"{img.stem}.jpg"
+    if not thumb.exists() or thumb.stat().st_mtime_ns < img.stat().st_mtime_ns:
+        with Image.open(img) as im:
+            im = im.convert("RGB")
+            im.thumbnail((THUMBNAIL_WIDTH, THUMBNAIL_WIDTH * 4))
+            buffer = io.BytesIO()
+            im.save(buffer, format="JPEG", quality=80)
+        LEDGER.write_bytes(thumb, buffer.getvalue())
+    return thumb
+
+def report_rows(images, groups, dest_lang):
+    # Una riga per rappresentativo: i suoi duplicati vengono compressi nella stessa riga
+    duplicates = {}
+    for img in images:
+        if groups.get(img.name, img.name) != img.name:
+            duplicates.setdefault(groups[img.name], []).append(img)
+    rows = []
+    for img in images:
+        txt_file = DIRS["ocr_output"] / f"{img.stem}.txt"
+        if groups.get(img.name, img.name) == img.name and txt_file.exists():
+            rows.append((img, txt_file, DIRS["translated_output"] / f"{img.stem}_{dest_lang}.txt", duplicates.get(img.name, [])))
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+        list(pool.map(make_thumbnail, [row[0] for row in rows]))
+    return rows
+
+def text_cell(path, label):
+    # Anteprima breve, testo completo in un <details> chiuso: il browser non lo impagina finché non viene aperto
+    text = path.read_text(encoding="utf-8")
+    cell = f"<td><a target='_blank' href='{path.parent.name}/{path.name}'>{label}</a><br><pre>{html.escape(text[:REPORT_PREVIEW_CHARS])}</pre>"
+    if len(text) > REPORT_PREVIEW_CHARS:
+        cell += f"<details><summary>Testo completo</summary><pre>{html.escape(text)}</pre></details>"
+    return cell + "</td>"
+
+def report_row(img, txt_file, tr_file, duplicates, timestamps, skipped, ocr_label, tr_label):
+    row = (f"<tr><td><a target='_blank' href='02.images/{img.name}'>"
+           f"<img loading='lazy' width={THUMBNAIL_WIDTH} src='03.thumbnails/{img.stem}.jpg'></a>")
+    if img.name in timestamps:
+        row += f"<br>⏱️ {format_timestamp(timestamps[img.name])}"
+    if duplicates:
+        links = "<br>".join(f"<a target='_blank' href='02.images/{dup.name}'>{dup.name}</a>"
+                            + (f" ⏱️ {format_timestamp(timestamps[dup.name])}" if dup.name in timestamps else "") for dup in duplicates)
+        row += f"<details><summary>{len(duplicates)} duplicati</summary>{links}</details>"
+    if img.stem in skipped:
+        return row + f"</td><td colspan=2>🚫 Nessun testo (punteggio {skipped[img.stem]:.4f}, OCR non eseguito)</td></tr>"
+    row += "</td>" + text_cell(txt_file, ocr_label)
+    row += text_cell(tr_file, tr_label) if tr_file.exists() else "<td>⚠️ Traduzione non disponibile</td>"
+    return row + "</tr>"
+
+def write_report_pages(report, head, table_head, rows, footer=""):
+    # Pagine da REPORT_PAGE_SIZE righe: la prima è il report stesso, le altre <report>_p2.html, <report>_p3.html, ...
+    pages = [rows[i:i + REPORT_PAGE_SIZE] for i in range(0, len(rows), REPORT_PAGE_SIZE)] or [[]]
+    names = [report.name] + [f"{report.stem}_p{n}.html" for n in range(2, len(pages) + 1)]
+    for n, (name, page) in enumerate(zip(names, pages), 1):
+        nav = "" if len(pages) == 1 else "<p>Pagine: " + " ".join(
+            f"<b>{k}</b>" if k == n else f"<a href='{names[k - 1]}'>{k}</a>" for k in range(1, len(pages) + 1)) + "</p>"
+        LEDGER.write_text(report.parent / name, head + nav + f"<table border=1>{table_head}{''.join(page)}</table>" + nav
+                          + (footer if n == 1 else "") + "</body></html>")
 
-    for video in DIRS["video"].glob("*"):
-        audio_path = audio_dir / f"{video.stem}.wav"
-        subprocess.run(f'ffmpeg -y -i "{video}" -vn -acodec pcm_s16le -ar 16000 -ac 1 "{audio_path}"', shell=True)
-
-        result = model.transcribe(str(audio_path))
-        transcript = result["text"]
-        audio_txt.write_text(transcript, encoding='utf-8')
-
-        translated_en = translator.translate(transcript, dest="en").text
-        audio_translated_en.write_text(translated_en, encoding='utf-8')
-
-        if mode == "online":
-            translated_it = translator.translate(transcript, dest="it").text
-            audio_translated_it.write_text(translated_it, encoding='utf-8')
-            return audio_txt, audio_translated_en, audio_translated_it
-
-    return audio_txt, audio_translated_en, None
-
-def create_html_report(lang, dest_lang, timestamp, audio_txt=None, audio_tr_en=None, audio_tr_it=None):
-    report = WORKING_DIR / f"index_{lang}_{dest_lang}_{timestamp}.html"
-    with open(report, "w", encoding="utf-8") as f:
-        f.write(f"<html><head><title>video2ocrTranslate {timestamp}</title></head><body>")
-        f.write(f"<pre>{ASCII_ART}</pre><h2>Report OCR e Traduzione</h2><table border=1>")
-        f.write("<tr><th>Frame</th><th>OCR</th><th>Traduzione</th></tr>")
-        for img in DIRS["images"].glob("*.png"):
-            name = img.name.replace(".png", ".txt")
-            txt_file = DIRS["ocr_output"] / name
-            tr_file = DIRS["translated_output"] / name.replace(".txt", f"_{dest_lang}.txt")
-            if txt_file.exists() and tr_file.exists():
-                f.write("<tr>")
-                f.write(f"<td><a target='_blank' href='02.images/{img.name}'><img width=300 src='02.images/{img.name}'></a></td>")
-                f.write(f"<td><a target='_blank' href='04.ocr_output/{txt_file.name}'>Testo</a><br><pre>{txt_file.read_text(encoding='utf-8')}</pre></td>")
-                f.write(f"<td><a target='_blank' href='05.translated_output/{tr_file.name}'>Traduzione</a><br><pre>{tr_file.read_text(encoding='utf-8')}</pre></td>")
-                f.write("</tr>")
-        f.write("</table>")
-
-        if audio_txt and audio_txt.exists():
-            f.write(f"<hr><h2>🎧 Audio Transcript</h2><p><a target='_blank' href='06.audio/{audio_txt.name}'>Testo</a></p><pre>{audio_txt.read_text()}</pre>")
-        if audio_tr_en and audio_tr_en.exists():
-            f.write(f"<h3>🌍 Traduzione in Inglese</h3><p><a target='_blank' href='06.audio/{audio_tr_en.name}'>Tradotto EN</a></p><pre>{audio_tr_en.read_text()}</pre>")
-        if audio_tr_it and audio_tr_it.exists():
-            f.write(f"<h3>🌍 Traduzione in Italiano</h3><p><a target='_blank' href='06.audio/{audio_tr_it.name}'>Tradotto IT</a></p><pre>{audio_tr_it.read_text()}</pre>")
-
-        f.write("</body></html>")
-    webbrowser.open_new_tab(str(report))
+def create_html_report(lang, dest_lang, timestamp, transcripts=None, groups=None, video=None):
+    # Con video: report parziale del solo video, disponibile appena la sua pipeline termina
+    report = WORKING_DIR / (f"index_{video.stem}_{lang}_{dest_lang}_{timestamp}.html" if video else f"index_{lang}_{dest_lang}_{timestamp}.html")
+    images = video_frames(video.stem) if video else sorted(DIRS["images"].glob("*.png"), key=frame_order)
+    timestamps = load_frame_timestamps(video)
+    skipped = INDEX.skipped()
+    rows = [report_row(*row, timestamps, skipped, "Testo", "Traduzione") for row in report_rows(images, groups or {}, dest_lang)]
+    head = (f"<html><head><meta charset='utf-8'><title>video2ocrTranslate {timestamp}</title></head><body>"
+            f"<pre>{ASCII_ART}</pre><h2>Report OCR e Traduzione</h2>")
+    with io.StringIO() as f:
+        for audio_video, files in transcripts or []:
+            stem = audio_video.stem
+            f.write(f"<hr><h2>🎧 Audio Transcript: {audio_video.name}</h2><p><a target='_blank' href='06.audio/{stem}.txt'>Testo</a> · "
+                    f"<a target='_blank' href='06.audio/{stem}.srt'>SRT</a> · <a target='_blank' href='06.audio/{stem}.vtt'>VTT</a> · "
+                    f"<a target='_blank' href='06.audio/{stem}.json'>Segmenti JSON</a></p><pre>{html.escape(files['txt'].read_text(encoding='utf-8'))}</pre>")
+            for audio_lang, language in AUDIO_LANGUAGES.items():
+                if audio_lang in files:
+                    f.write(f"<h3>🌍 Traduzione in {language}</h3><p><a target='_blank' href='06.audio/{files[audio_lang].name}'>Tradotto {audio_lang.upper()}</a> · "
+                            f"<a target='_blank' href='06.audio/{stem}_{audio_lang}.srt'>SRT</a></p><pre>{html.escape(files[audio_lang].read_text(encoding='utf-8'))}</pre>")
+        f.write(subtitle_section(video, dest_lang))
+        write_report_pages(report, head, "<tr><th>Frame</th><th>OCR</th><th>Traduzione</th></tr>", rows, f.getvalue())
+    if not video:
+        webbrowser.open_new_tab(str(report))
     return report
 
-def final_zip_and_hash(timestamp, report_path):
+def probe_subtitles(video):
+    # Tracce di sottotitoli leggibili del video: indice dello stream, codec e lingua
+    output = subprocess.run(["ffprobe", "-v", "error", "-select_streams", "s", "-show_entries", "stream=index,codec_name:stream_tags=language",
+                             "-of", "json", str(video)], capture_output=True, text=True).stdout
+    try:
+        streams = json.loads(output or "{}").get("streams", [])
+    except json.JSONDecodeError:
+        streams = []
+    return [{"index": stream["index"], "codec": stream["codec_name"],
+             "language": re.sub(r"[^A-Za-z]", "", stream.get("tags", {}).get("language", "")) or "und"}
+            for stream in streams if stream.get("codec_name") in TEXT_SUBTITLE_CODECS | BITMAP_SUBTITLE_CODECS]
+
+def srt_seconds(hours, minutes, seconds, millis):
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds) + int(millis) / 1000
+
+def parse_srt(text):
+    # Cue SRT (anche ASS, mov_text e WebVTT, convertiti da ffmpeg) senza tag di stile
+    cues = []
+    for block in re.split(r"\n\s*\n", text.replace("\r\n", "\n").strip()):
+        lines = block.split("\n")
+        timing = next((i for i, line in enumerate(lines) if SRT_TIMING.search(line)), None)
+        if timing is None:
+            continue
+        values = SRT_TIMING.search(lines[timing]).groups()
+        body = re.sub(r"<[^>]+>|\{\\[^}]*\}", "", "\n".join(lines[timing + 1:])).strip()
+        if body:
+            cues.append({"start": srt_seconds(*values[:4]), "end": srt_seconds(*values[4:]), "text": body})
+    return cues
+
+def extract_text_subtitles(video, track):
+    cmd = ["ffmpeg", "-nostdin", "-v", "error", "-i", str(video), "-map", f"0:{track['index']}", "-f", "srt", "-"]
+    with CPU_BUDGET:
+        result = subprocess.run(cmd, capture_output=True)
+    if result.returncode != 0:
+        print(f"⚠️ {video.name}: estrazione della traccia {track['index']} fallita: {result.stderr.decode('utf-8', 'replace').strip()}")
+        return None
+    return parse_srt(result.stdout.decode("utf-8", "replace"))
+
+def ocr_bitmap_subtitles(video, track, lang, backend="subprocess"):
+    # I sottotitoli bitmap vengono renderizzati da soli su fondo nero a SUBTITLE_FRAMERATE fps: ogni immagine diversa
+    # dalla precedente è un nuovo sottotitolo, ritagliata al riquadro dei pixel accesi; all'OCR arrivano solo i ritagli
+    size = probe_video_size(video)
+    if size is None:
+        print(f"⚠️ {video.name}: traccia {track['index']} non renderizzabile, nessuno stream video")
+        return None
+    width, height = size
+    graph = f"[0:v]drawbox=c=black:replace=1:t=fill[bg];[bg][0:{track['index']}]overlay=eof_action=pass,fps={SUBTITLE_FRAMERATE},format=gray"
+    cmd = ["ffmpeg", "-nostdin", "-v", "error", "-i", str(video), "-filter_complex", graph, "-an", "-sn", "-f", "rawvideo", "-"]
+    with CPU_BUDGET:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stderr = []
+        reader = threading.Thread(target=lambda: stderr.append(proc.stderr.read().decode("utf-8", "replace")))
+        reader.start()
+        cues, signature, n = [], None, 0
+        while len(data := proc.stdout.read(width * height)) == width * height:
+            pixels = np.frombuffer(data, dtype=np.uint8).reshape(height, width)
+            lit = pixels > 32
+            crop, current = None, None
+            if lit.any():
+                rows, cols = np.flatnonzero(lit.any(axis=1)), np.flatnonzero(lit.any(axis=0))
+                crop = pixels[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+                current = (rows[0], cols[0], hashlib.sha1(crop.tobytes()).hexdigest())
+            if current != signature:
+                if cues and cues[-1]["end"] is None:
+                    cues[-1]["end"] = n / SUBTITLE_FRAMERATE
+                if crop is not None:
+                    cues.append({"start": n / SUBTITLE_FRAMERATE, "end": None, "image": Image.fromarray(crop.copy())})
+                signature = current
+            n += 1
+        proc.stdout.close()
+        proc.wait()
+        reader.join()
+    if proc.returncode != 0:
+        print(f"⚠️ {video.name}: rendering della traccia {track['index']} fallito: {''.join(stderr).strip()}")
+        return None
+    if cues and cues[-1]["end"] is None:
+        cues[-1]["end"] = n / SUBTITLE_FRAMERATE
+    # Ritagli binarizzati con un bordo bianco, letti come blocco di testo a gruppi di OCR_BATCH_SIZE
+    images = []
+    for cue in cues:
+        crop = binarize(cue.pop("image"))
+        images.append(Image.new("L", (crop.width + 2 * ROI_GAP, crop.height + 2 * ROI_GAP), 255))
+        images[-1].paste(crop, (ROI_GAP, ROI_GAP))
+    recognize = OCR_BACKENDS[resolve_ocr_backend(backend)]
+    results = []
+    for i in range(0, len(images), OCR_BATCH_SIZE):
+        with CPU_BUDGET:
+            results += recognize(images[i:i + OCR_BATCH_SIZE], lang, ROI_PSM)
+    return [dict(cue, text=text.strip()) for cue, (text, _) in zip(cues, results) if text.strip()]
+
+def process_subtitles(video, lang, backend="subprocess", translation=None, dest_lang=None):
+    # Ogni traccia in 07.subtitles: <video>.<stream>.<lingua>.txt/.srt/.vtt e la traduzione <...>_<dest>.txt/.srt/.vtt.
+    # Le tracce testuali non passano dall'OCR, di quelle bitmap solo i ritagli dei sottotitoli.
+    # Restituisce solo le tracce da cui è uscito del testo: senza, il video passa all'OCR dei frame
+    tracks = probe_subtitles(video)
+    extracted = []
+    for track in tracks:
+        bitmap = track["codec"] in BITMAP_SUBTITLE_CODECS
+        key = STAGES.key(video.stem, STAGES.file_digest(video), track["index"], track["codec"],
+                         *([lang, resolve_ocr_backend(backend), tesseract_version()] if bitmap else []))
+        done = STAGES.get("subtitles", key)
+        if done is None:
+            print(f"💬 {video.name}: traccia {track['index']} ({track['codec']}, {track['language']})"
+                  + (", OCR dei sottotitoli bitmap..." if bitmap else ", estrazione del testo..."))
+            cues = ocr_bitmap_subtitles(video, track, lang, backend) if bitmap else extract_text_subtitles(video, track)
+            if cues is None:
+                continue
+            done = {"cues": cues}
+            STAGES.put("subtitles", key, done)
+        if not done["cues"]:
+            print(f"⚠️ {video.name}: traccia {track['index']} senza sottotitoli")
+            continue
+        extracted.append(track)
+        base = DIRS["subtitles"] / f"{video.stem}.{track['index']}.{track['language']}"
+        texts = [cue["text"] for cue in done["cues"]]
+        write_transcript(base, done["cues"], texts)
+        translations = translation.translate(texts, dest_lang) if translation and texts else None
+        if translations:
+            write_transcript(f"{base}_{dest_lang}", done["cues"], translations)
+        INDEX.put_subtitles(video.stem, track["index"], done["cues"], track["language"], translations)
+    if tracks and not extracted:
+        print(f"⚠️ {video.name}: nessuna traccia di sottotitoli utilizzabile, si passa all'OCR dei frame")
+    return extracted
+
+def subtitle_section(video=None, dest_lang=""):
+    # Sottotitoli estratti, con la traduzione, in coda al report
+    section = ""
+    for srt in sorted(DIRS["subtitles"].glob("*.srt")):
+        match = re.fullmatch(r"(.+)\.(\d+)\.([A-Za-z]+)\.srt", srt.name)
+        if not match or (video is not None and match[1] != video.stem):
+            continue
+        section += (f"<hr><h2>💬 Sottotitoli: {html.escape(match[1])} · traccia {match[2]} ({match[3]})</h2><p>"
+                    f"<a target='_blank' href='07.subtitles/{srt.name}'>SRT</a> · <a target='_blank' href='07.subtitles/{srt.stem}.vtt'>VTT</a> · "
+                    f"<a target='_blank' href='07.subtitles/{srt.stem}.txt'>Testo</a></p><pre>{html.escape(srt.read_text(encoding='utf-8'))}</pre>")
+        translated = srt.with_name(f"{srt.stem}_{dest_lang}.srt")
+        if dest_lang and translated.exists():
+            section += (f"<h3>🌍 Traduzione ({dest_lang})</h3><p><a target='_blank' href='07.subtitles/{translated.name}'>SRT</a></p>"
+                        f"<pre>{html.escape(translated.read_text(encoding='utf-8'))}</pre>")
+    return section
+
+def write_stage_hashes(timestamp, translated=True):
+    extracted_files = sorted(DIRS["images"].glob("*.png")) + sorted(DIRS["images"].glob("*.timestamps.csv"))
+    calculate_hashes(extracted_files, WORKING_DIR / f"hash-images-{timestamp}.csv")
+    calculate_hashes(sorted(DIRS["ocr_output"].glob("*.txt")), WORKING_DIR / f"hash-ocr-{timestamp}.csv")
+    if translated:
+        calculate_hashes(sorted(DIRS["translated_output"].glob("*.txt")), WORKING_DIR / f"hash-translated-{timestamp}.csv")
+
+def process_video_safely(video, args, timestamp, translation=None):
+    # Un file non elaborabile (sottocartella, file senza video, ...) viene segnalato e saltato: gli altri video,
+    # il report finale, gli hash e l'archivio vengono prodotti comunque
+    try:
+        return process_video(video, args, timestamp, translation)
+    except Exception as e:
+        print(f"❌ {video.name if video is not None else DIRS['images'].name}: elaborazione fallita: {e}")
+        return {}, []
+
+def process_video(video, args, timestamp, translation=None):
+    # Pipeline di un singolo video: estrazione → OCR → traduzione → report, indipendente dagli altri video.
+    # Con video=None vengono elaborate le immagini già presenti in 02.images
+    regions = args.roi or ("auto" if args.text_regions else None)
+    # Con tracce di sottotitoli (--subtitles auto) l'OCR dei frame non serve
+    tracks = process_subtitles(video, args.lang, args.ocr_backend, translation, args.translate_language) if video is not None and args.subtitles != "off" else []
+    if tracks and args.subtitles == "auto":
+        print(f"💬 {video.name}: {len(tracks)} tracce di sottotitoli, OCR dei frame saltato")
+        groups, dedup_rows = {}, []
+    elif video is not None and args.stream:
+        groups, dedup_rows = stream_ocr(args.lang, args.framerate, args.extract_mode, args.scene_threshold, args.min_interval, args.max_interval,
+                                        args.ocr_workers, args.ocr_backend, args.dedup_threshold, [video], regions, args.text_threshold)
+    else:
+        if video is not None:
+            extract_frames(args.framerate, args.extract_mode, args.scene_threshold, args.min_interval, args.max_interval, [video])
+        images = video_frames(video.stem) if video is not None else sorted(DIRS["images"].glob("*.png"), key=frame_order)
+        groups, dedup_rows = {}, []
+        if args.dedup_threshold is not None:
+            groups, dedup_rows = dedup_frames(args.dedup_threshold, args.ocr_workers, images)
+            images = sorted((DIRS["images"] / name for name in set(groups.values())), key=frame_order)
+        run_ocr(args.lang, args.ocr_workers, images, args.ocr_backend, regions, args.text_threshold)
+    INDEX.put_duplicates(groups)
+    if translation:
+        files = None if video is None else [DIRS["ocr_output"] / f"{img.stem}.txt" for img in video_frames(video.stem)]
+        translate_texts(args.translate_language, translation, args.translator, files)
+    if video is not None:
+        report = create_html_report(args.lang, args.translate_language, timestamp, groups=groups, video=video)
+        print(f"✅ {video.name}: report pronto in {report}")
+    return groups, dedup_rows
+
+class HashingWriter:
+    # Flusso di uscita senza seek: zipfile scrive i descrittori dopo i dati senza mai tornare indietro,
+    # così l'hash dell'archivio viene calcolato mentre l'archivio viene scritto
+    def __init__(self, f):
+        self.f = f
+        self.hashes = [hashlib.new(name) for name in HASH_ALGORITHMS]
+        self.position = 0
+
+    def write(self, data):
+        for digest in self.hashes:
+            digest.update(data)
+        self.position += len(data)
+        return self.f.write(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        self.f.flush()
+
+    def digests(self):
+        return [digest.hexdigest() for digest in self.hashes]
+
+def read_artifact(path):
+    # I file piccoli vengono letti e hashati in un thread e passano interi al compressore;
+    # quelli grandi (None) vengono letti a blocchi dal writer, che li hasha e comprime nella stessa lettura
+    if path.stat().st_size > ARCHIVE_BUFFER:
+        return None
+    data = path.read_bytes()
+    return data, LEDGER.digests(path) or [hashlib.new(name, data).hexdigest() for name in HASH_ALGORITHMS]
+
+def final_zip_and_hash(timestamp, compression="deflate"):
+    print("📦 Creazione pacchetto finale...")
     zip_file = WORKING_DIR / f"acquisizione-forense-{timestamp}.zip"
-    with zipfile.ZipFile(zip_file, 'w') as z:
-        for d in DIRS.values():
-            for f in d.rglob("*"):
-                z.write(f, arcname=f.relative_to(WORKING_DIR))
-        z.write(report_path, arcname=report_path.name)
-    calculate_hashes([*WORKING_DIR.rglob("*.*")], WORKING_DIR / f"hash-final-{timestamp}.csv")
+    # Dati, report e CSV di questa esecuzione; gli archivi delle esecuzioni precedenti restano fuori
+    files = [f for d in ARCHIVE_DIRS for f in sorted(d.rglob("*")) if f.is_file()]
+    files += sorted(WORKING_DIR.glob(f"index_*{timestamp}*.html")) + sorted(WORKING_DIR.glob(f"*-{timestamp}.csv"))
+    manifest = io.StringIO()
+    writer = csv.writer(manifest)
+    writer.writerow(["File", "Size", "Compression", *(name.upper() for name in HASH_ALGORITHMS)])
+    total = 0
+
+    def add(z, path, entry):
+        nonlocal total
+        info = zipfile.ZipInfo.from_file(path, arcname=path.relative_to(WORKING_DIR).as_posix())
+        stored = path.suffix.lower() in ARCHIVE_STORED
+        info.compress_type = zipfile.ZIP_STORED if stored else ARCHIVE_METHODS[compression]
+        if entry is not None:
+            data, digests = entry
+            z.writestr(info, data)
+        else:
+            known = LEDGER.digests(path)
+            hashes = [] if known else [hashlib.new(name) for name in HASH_ALGORITHMS]
+            with open(path, "rb") as src, z.open(info, "w", force_zip64=True) as dst:
+                while chunk := src.read(HASH_CHUNK_SIZE):
+                    for digest in hashes:
+                        digest.update(chunk)
+                    dst.write(chunk)
+            digests = known or [digest.hexdigest() for digest in hashes]
+        LEDGER.record(path, digests)
+        total += info.file_size
+        writer.writerow([info.filename, info.file_size, "store" if stored else compression, *digests])
+
+    with open(zip_file, "wb") as raw:
+        output = HashingWriter(raw)
+        with zipfile.ZipFile(output, "w") as z, ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+            # Lettura e hash dei file successivi procedono nei thread mentre il writer comprime quello corrente;
+            # la finestra limitata tiene in memoria al massimo pochi file per thread
+            pending = deque()
+            for path in files:
+                pending.append((path, pool.submit(read_artifact, path)))
+                if len(pending) >= HASH_WORKERS * 4:
+                    path, future = pending.popleft()
+                    add(z, path, future.result())
+            while pending:
+                path, future = pending.popleft()
+                add(z, path, future.result())
+            # Manifest con dimensioni e hash di ogni file, dentro l'archivio stesso
+            z.writestr(f"manifest-{timestamp}.csv", manifest.getvalue(), compress_type=ARCHIVE_METHODS[compression])
+    LEDGER.record(zip_file, output.digests())
+    print(f"✅ {len(files)} file ({total / 1024 ** 2:.1f} MB) archiviati in {zip_file.name} con una sola lettura")
+    calculate_hashes(files + [zip_file], WORKING_DIR / f"hash-final-{timestamp}.csv")
 
 def main():
+    global HASH_ALGORITHMS, HASH_WORKERS, CPU_SLOTS, CPU_BUDGET
     parser = argparse.ArgumentParser(description="OCR + Audio Whisper con traduzioni")
     parser.add_argument("--lang", type=str, default="eng", help="Lingua OCR per Tesseract chi_sim ara rus ukr")
     parser.add_argument("--translate-language", type=str, default="it", help="Lingua destinazione per testo OCR")
     parser.add_argument("--framerate", type=int, default=5, help="Frame rate estrazione da video")
+    parser.add_argument("--extract-mode", choices=["fixed", "scene", "keyframe"], default="fixed", help="Modalità di estrazione: fixed (framerate), scene (cambi di scena), keyframe (solo keyframe)")
+    parser.add_argument("--scene-threshold", type=float, default=0.3, help="Soglia di cambio scena ffmpeg (0-1) per --extract-mode scene")
+    parser.add_argument("--min-interval", type=float, default=0.5, help="Intervallo minimo in secondi tra due frame (scene/keyframe)")
+    parser.add_argument("--max-interval", type=float, default=10.0, help="Intervallo massimo in secondi tra due frame (scene)")
+    parser.add_argument("--ocr-workers", type=int, default=1, help="Numero di processi Tesseract in parallelo")
+    parser.add_argument("--ocr-backend", choices=sorted(OCR_BACKENDS), default="subprocess", help="Backend OCR: subprocess (un processo per frame), tesserocr (API C, modello caricato una volta per worker), batch (un processo per blocco di frame), montage (blocco di frame impilati in un'unica immagine, un'unica chiamata)")
+    parser.add_argument("--dedup-threshold", type=int, default=None, help="Salta l'OCR dei frame quasi identici (distanza di Hamming dHash, es. 5)")
+    parser.add_argument("--stream", action="store_true", help="Decodifica i frame via pipe ffmpeg e li passa all'OCR in memoria; salva solo i frame con testo (o i rappresentativi)")
+    parser.add_argument("--subtitles", choices=["auto", "both", "off"], default="auto", help="Tracce di sottotitoli dei video: auto (testo estratto direttamente, OCR dei soli sottotitoli bitmap, OCR dei frame solo per i video senza tracce utilizzabili), both (anche OCR dei frame), off (ignorate)")
+    parser.add_argument("--text-regions", action="store_true", help="Individua le regioni con testo di ogni frame (densità dei bordi) e passa a Tesseract solo i ritagli binarizzati")
+    parser.add_argument("--roi", type=parse_roi, action="append", default=None, help="Regione fissa x,y,w,h in pixel o in frazioni del frame (es. 0,0.8,1,0.2 per la fascia dei sottotitoli); ripetibile")
+    parser.add_argument("--text-threshold", type=float, default=None, help="Salta l'OCR dei frame con punteggio di testo (densità dei bordi su una miniatura, 0-1) sotto questa soglia, es. 0.0002")
+    parser.add_argument("--calibrate-text", type=str, default=None, metavar="CSV", help="Calcola i punteggi di un campione etichettato (frame, testo 1/0), mostra quanti frame con testo ogni soglia perderebbe ed esce")
+    parser.add_argument("--translator", choices=sorted(TRANSLATORS), default="google", help="Backend di traduzione: google (googletrans), libretranslate (server compatibile LibreTranslate, anche locale), argos o marian (offline, su CPU)")
+    parser.add_argument("--source-language", type=str, default=None, help="Lingua sorgente ISO 639-1 per la traduzione (default: auto, o ricavata da --lang per i traduttori offline)")
+    parser.add_argument("--translate-url", type=str, default="http://localhost:5000", help="URL del server LibreTranslate")
+    parser.add_argument("--translate-batch-chars", type=int, default=4000, help="Caratteri massimi per richiesta di traduzione")
+    parser.add_argument("--translate-concurrency", type=int, default=4, help="Richieste di traduzione contemporanee")
+    parser.add_argument("--translate-rate", type=float, default=5.0, help="Richieste di traduzione al secondo (token bucket)")
+    parser.add_argument("--translate-retries", type=int, default=5, help="Tentativi aggiuntivi per richiesta fallita (backoff esponenziale)")
+    parser.add_argument("--translation-cache-size", type=int, default=100000, help="Numero massimo di voci nella cache delle traduzioni (LRU)")
+    parser.add_argument("--hash-algorithms", type=str, default="sha256", help="Algoritmi di hash separati da virgola, calcolati in un'unica lettura (es. sha256,md5,sha1)")
+    parser.add_argument("--hash-workers", type=int, default=HASH_WORKERS, help="Thread per il calcolo degli hash")
+    parser.add_argument("--video-workers", type=int, default=2, help="Video elaborati in parallelo, ognuno con la propria pipeline estrazione → OCR → traduzione → report")
+    parser.add_argument("--cpu-budget", type=int, default=os.cpu_count() or 1, help="Numero massimo di processi ffmpeg/Tesseract/Whisper attivi contemporaneamente tra tutti i video")
+    parser.add_argument("--at", type=str, default=None, help="Mostra dall'indice cosa era a schermo e cosa veniva detto in quell'istante (HH:MM:SS[.mmm]) ed esce")
+    parser.add_argument("--search", type=str, default=None, help="Cerca parole nel testo OCR e nelle traduzioni indicizzate (parola* per prefisso) ed esce")
+    parser.add_argument("--search-limit", type=int, default=50, help="Numero massimo di risultati di --search")
+    parser.add_argument("--video", type=str, default=None, help="Limita --at e --search al video indicato (nome senza estensione)")
+    parser.add_argument("--force", action="store_true", help="Ignora la cache delle fasi e rielabora tutti gli input")
+    parser.add_argument("--verify", action="store_true", help="Al termine rilegge tutti gli artefatti e li confronta con gli hash registrati")
+    parser.add_argument("--archive-compression", choices=sorted(ARCHIVE_METHODS), default="deflate", help="Compressione dei file di testo nell'archivio finale (immagini, audio e video vengono solo memorizzati)")
     parser.add_argument("--audio-offline", action="store_true", help="Trascrizione + traduzione EN")
     parser.add_argument("--audio-online", action="store_true", help="Trascrizione + traduzione EN/IT")
     parser.add_argument("--whisper-model", type=str, default="base", help="Modello Whisper (base, small, medium, large)")
+    parser.add_argument("--whisper-workers", type=int, default=max(1, (os.cpu_count() or 1) // 4), help="Processi Whisper in parallelo, ognuno carica il modello una sola volta")
+    parser.add_argument("--whisper-chunk", type=float, default=60.0, help="Durata indicativa in secondi dei blocchi audio, tagliati nei silenzi")
+    parser.add_argument("--keep-wav", action="store_true", help="Salva anche l'audio decodificato in 06.audio/<video>.wav (catena di custodia)")
+    parser.add_argument("--whisper-backend", choices=["openai", "faster"], default="openai", help="Motore Whisper: openai (PyTorch float32) o faster (faster-whisper/CTranslate2 int8, più rapido su CPU)")
+    parser.add_argument("--whisper-benchmark", nargs="?", const=WHISPER_BENCHMARK_MODELS, default=None, metavar="MODELLI",
+                        help=f"Confronta RTF e memoria dei backend Whisper per i modelli indicati (default: {WHISPER_BENCHMARK_MODELS}) sul primo video ed esce")
+    parser.add_argument("--benchmark-seconds", type=float, default=120.0, help="Secondi di audio usati dal benchmark Whisper")
     args = parser.parse_args()
 
+    HASH_ALGORITHMS = [name.strip().lower() for name in args.hash_algorithms.split(",") if name.strip()]
+    unknown = [name for name in HASH_ALGORITHMS if name not in hashlib.algorithms_available]
+    if unknown:
+        parser.error(f"algoritmi di hash non supportati: {', '.join(unknown)}")
+    HASH_WORKERS = max(1, args.hash_workers)
+    CPU_SLOTS = max(1, args.cpu_budget)
+    CPU_BUDGET = threading.BoundedSemaphore(CPU_SLOTS)
+
+    if args.at or args.search:
+        if not (WORKING_DIR / "index.sqlite").exists():
+            print("❌ Nessun indice: esegui prima l'elaborazione")
+            return
+        INDEX.open(WORKING_DIR / "index.sqlite")
+        if args.at:
+            print_lookup(parse_time(args.at), args.video)
+        if args.search:
+            print_search(args.search, args.video, args.search_limit)
+        INDEX.close()
+        return
+
     check_dependencies()
     timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
     ensure_directories()
+    if args.calibrate_text:
+        calibrate_text_threshold(Path(args.calibrate_text), timestamp, args.text_threshold)
+        return
+    STAGES.open(WORKING_DIR / "stage-cache.sqlite", args.force)
+    INDEX.open(WORKING_DIR / "index.sqlite")
+    if args.whisper_benchmark:
+        benchmark_whisper(timestamp, [name.strip() for name in args.whisper_benchmark.split(",") if name.strip()], args.benchmark_seconds)
+        STAGES.close()
+        INDEX.close()
+        return
 
-    video_files = list(DIRS["video"].glob("*"))
+    video_files = sorted(DIRS["video"].glob("*"))
     image_files = list(DIRS["images"].glob("*.png"))
 
-    if video_files:
-        extract_frames(args.framerate, timestamp)
-
     if video_files or image_files:
-        run_ocr(args.lang, timestamp)
-        translate_texts(args.translate_language, timestamp)
-
-        audio_txt = audio_tr_en = audio_tr_it = None
-        if args.audio_offline:
-            audio_txt, audio_tr_en, audio_tr_it = process_audio_whisper(timestamp, mode="offline", model_size=args.whisper_model)
-        elif args.audio_online:
-            audio_txt, audio_tr_en, audio_tr_it = process_audio_whisper(timestamp, mode="online", model_size=args.whisper_model)
+        translation = TranslationService(TranslationCache(WORKING_DIR / "translation-cache.sqlite", args.translation_cache_size),
+                                         make_translator(args.translator, args.translate_url, [(source_language(args), args.translate_language)]), args.translate_batch_chars,
+                                         args.translate_concurrency, 0 if args.translator in OFFLINE_TRANSLATORS else args.translate_rate,
+                                         args.translate_retries, WORKING_DIR / "translation-failures.jsonl", source_language(args))
+        audio_mode = "offline" if args.audio_offline else "online" if args.audio_online else None
+        if audio_mode:
+            ensure_whisper(args.whisper_backend)
+        groups, dedup_rows = {}, []
+        # L'audio procede in parallelo ai video, che scorrono ciascuno nella propria pipeline
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="audio") as audio_pool, \
+                ThreadPoolExecutor(max_workers=max(1, args.video_workers), thread_name_prefix="video") as pool:
+            audio = audio_pool.submit(process_audio_whisper, translation, audio_mode, args.whisper_model,
+                                      args.whisper_workers, args.whisper_chunk, args.keep_wav, args.whisper_backend) if audio_mode else None
+            for video_groups, video_rows in pool.map(lambda video: process_video_safely(video, args, timestamp, translation), video_files or [None]):
+                groups.update(video_groups)
+                dedup_rows.extend(video_rows)
+            transcripts = audio.result() if audio else []
+        translation.close()
+        if args.dedup_threshold is not None:
+            write_dedup_csv(dedup_rows, timestamp)
+        write_stage_hashes(timestamp)
 
-        report_path = create_html_report(args.lang, args.translate_language, timestamp, audio_txt, audio_tr_en, audio_tr_it)
-        final_zip_and_hash(timestamp, report_path)
+        create_html_report(args.lang, args.translate_language, timestamp, transcripts, groups)
+        STAGES.close()
+        INDEX.close()
+        final_zip_and_hash(timestamp, args.archive_compression)
+        if args.verify:
+            verify_hashes()
     else:
         print("❌ Nessun file trovato per elaborazione.")
 